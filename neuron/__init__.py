@@ -1 +1 @@
-from utils.neuron import *
+from .utils.neuron import *
@@ -0,0 +1,67 @@
+# tests for utils/adaptive_LIF_neuron_notebook.py
+# run from the repository root with python -m unittest discover neuron/tests
+import unittest
+import numpy as np
+from numpy.testing import assert_allclose
+
+try:
+    import matplotlib
+    matplotlib.use('Agg')
+    from matplotlib.pyplot import close, figure
+    from neuron.utils import adaptive_LIF_neuron_notebook as nb
+except ImportError:  # the notebook module plots with matplotlib
+    nb = None
+from neuron.utils import neuron as nrn
+
+
+@unittest.skipIf(nb is None, 'matplotlib is not installed')
+class TestSweepALIF(unittest.TestCase):
+    def setUp(self):
+        self.dt = 1e-4
+        self.max_u = 5.
+        self.params = (.02, .002, 1.)  # taum, tref, xt
+        self.ax = figure().add_subplot(111)
+
+    def tearDown(self):
+        close('all')
+
+    def check_sweep(self, af_vals, tauf_vals, labels):
+        """Checks the plotted curves against one sweep value at a time"""
+        taum, tref, xt = self.params
+        num_lines = [l for l in self.ax.lines if l.get_marker() != 'o']
+        sim_lines = [l for l in self.ax.lines if l.get_marker() == 'o']
+        self.assertEqual(len(num_lines), len(af_vals)+1)
+        self.assertEqual(len(sim_lines), len(af_vals))
+
+        u, lif_fi = num_lines[0].get_data()
+        assert_allclose(lif_fi, nrn.th_lif_fi(u, *self.params))
+        max_f = max(lif_fi)
+        for af, tauf, label, num_line, sim_line in zip(
+                af_vals, tauf_vals, labels, num_lines[1:], sim_lines):
+            self.assertEqual(num_line.get_label(), label)
+            u, num_af = num_line.get_data()
+            assert_allclose(num_af, nrn.num_alif_fi(
+                u, taum, tref, xt, af, tauf, max_f=max_f), rtol=.01)
+            # the batch runs for as long as its slowest neuron needs, so
+            # the last ISI is measured at a different phase of the time step
+            _u, sim_af = sim_line.get_data()
+            assert_allclose(sim_af, nrn.sim_alif_fi(
+                self.dt, _u, taum, tref, xt, af, tauf), rtol=.005)
+
+    def test_sim_vs_num_tauf(self):
+        tauf = np.array([.01, .05])
+        nb.sim_vs_num_tauf(self.dt, None, self.max_u, *self.params, af=.1,
+                           tauf=tauf, ax=self.ax)
+        self.check_sweep([.1, .1], tauf,
+                         [r'$\tau_f=%.3f$' % val for val in tauf])
+
+    def test_sim_vs_num_af(self):
+        af = np.array([.05, .5])
+        nb.sim_vs_num_af(self.dt, None, self.max_u, *self.params, af=af,
+                         tauf=.02, ax=self.ax)
+        self.check_sweep(af, [.02, .02],
+                         [r'$\alpha_f=%.3f$' % val for val in af])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,525 @@
+# tests for utils/neuron.py
+# run from the repository root with python -m unittest discover neuron/tests
+import os
+import sys
+import unittest
+import numpy as np
+from numpy.testing import assert_allclose, assert_array_equal
+from scipy.optimize import brentq
+
+# the pool tests fork after the parallel kernels have run, which makes the
+# interpreter hang at exit with numba's TBB threading layer
+os.environ.setdefault('NUMBA_THREADING_LAYER', 'workqueue')
+from neuron.utils import neuron as nrn  # noqa: E402
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+
+def capture_stdout(func, *args, **kwargs):
+    """Calls func and returns its return value and what it printed"""
+    stdout = sys.stdout
+    sys.stdout = StringIO()
+    try:
+        retval = func(*args, **kwargs)
+        printed = sys.stdout.getvalue()
+    finally:
+        sys.stdout = stdout
+    return retval, printed
+
+
+###############################################################################
+# references written like the original, unoptimized implementations ###########
+###############################################################################
+def ref_lif_fi(u, tau, tref, xt):
+    f = np.zeros_like(u)
+    idx = u > xt
+    f[idx] = 1./(tref-tau*np.log(1-xt/u[idx]))
+    return f
+
+
+def ref_alif_fi(u_in, tau_m, tref, xt, af, tau_f, min_f=.001):
+    """Solves for each firing rate separately with scipy"""
+    tspk_low = 1./(1./tref) - tref
+    tspk_high = 1./min_f - tref
+    f = np.zeros_like(u_in)
+    for i, u_val in enumerate(u_in):
+        args = (tau_m, tref, xt, af, tau_f, u_val)
+        if nrn._alif_u_tspk_err(tspk_high, *args) >= 0.:
+            continue
+        with np.errstate(divide='ignore'):  # u is infinite at tspk=0
+            tspk = brentq(nrn._alif_u_tspk_err, tspk_low, tspk_high,
+                          args=args, xtol=1e-15, rtol=1e-15)
+        f[i] = 1./(tref+tspk)
+    return f
+
+
+def ref_run_alifsoma(dt, u_in, tau_m, tref, xt, af, tau_f, fstate0=0.):
+    """Steps adaptive LIF somas one neuron at a time. af=0 gives LIF somas"""
+    nsteps, nneurons = u_in.shape
+    decay = np.expm1(-dt/tau_m)+1
+    increment = 1-decay
+    fdecay = np.expm1(-dt/tau_f)+1
+    fincrement = 1-fdecay
+    spiketimes = []
+    for j in range(nneurons):
+        spk_t = []
+        V = 0.
+        Vf = fstate0
+        refractory_time = 0.
+        for i in range(1, nsteps):
+            Vf = fdecay*Vf
+            V_new = decay*V + increment*(u_in[i, j] - af*Vf)
+            dV = V_new-V
+            refractory_time -= dt
+            V_new *= min(max(1-refractory_time/dt, 0.), 1.)
+            if V_new > xt:
+                interp_spiketime = dt*(1-(V_new-xt)/dV)
+                spk_t.append(interp_spiketime + i*dt)
+                V_new = 0.
+                refractory_time = tref + interp_spiketime
+                Vf += fincrement/dt
+            V = V_new
+        spiketimes.append(np.array(spk_t))
+    return spiketimes
+
+
+def ref_sim_lif_fi(dt, u, tau, tref, xt):
+    """Simulates each input separately for 5 expected ISIs"""
+    th_f = ref_lif_fi(u, tau, tref, xt)
+    f = np.zeros_like(u)
+    for i, u_val in enumerate(u):
+        if th_f[i] < .01:
+            continue
+        u_in = u_val + np.zeros((int(np.ceil(5./th_f[i]/dt)), 1))
+        spk_t = ref_run_alifsoma(dt, u_in, tau, tref, xt, 0., 1.)[0]
+        f[i] = 1./np.diff(spk_t[-2:])[0]
+    return f
+
+
+def assert_spiketimes_close(test, spiketimes, ref_spiketimes):
+    test.assertEqual(len(spiketimes), len(ref_spiketimes))
+    for spk_t, ref_spk_t in zip(spiketimes, ref_spiketimes):
+        test.assertEqual(len(spk_t), len(ref_spk_t))
+        assert_allclose(spk_t, ref_spk_t, rtol=1e-9)
+
+
+###############################################################################
+# tests #######################################################################
+###############################################################################
+class TestRootFinders(unittest.TestCase):
+    @staticmethod
+    def func(x, c):
+        """Positive below its root at sqrt(c) and negative above it"""
+        return c - x*x
+
+    @staticmethod
+    def fprime(x, c):
+        return -2.*x
+
+    def setUp(self):
+        self.c = np.array([1e-2, .5, 2., 1e4])
+        self.a = np.zeros_like(self.c)
+        self.b = np.zeros_like(self.c) + 1e3
+
+    def test_bisect_converges(self):
+        x, exit_msg = nrn._vectorized_bisect(
+            self.func, self.a, self.b, args=(self.c,), tol=1e-12)
+        self.assertTrue(exit_msg.startswith('reached tolerance'), exit_msg)
+        assert_allclose(x, np.sqrt(self.c), rtol=1e-9)
+
+    def test_bisect_stops_at_adjacent_floats(self):
+        # tol cannot be met, so bisection runs until the brackets are 1 ULP
+        x, exit_msg = nrn._vectorized_bisect(
+            self.func, self.a, self.b, args=(self.c,), tol=0.)
+        self.assertTrue(exit_msg.startswith('reached bracket width'),
+                        exit_msg)
+        assert_allclose(x, np.sqrt(self.c), rtol=4*np.finfo(float).eps)
+
+    def test_bisect_max_iter(self):
+        x, exit_msg = nrn._vectorized_bisect(
+            self.func, self.a, self.b, args=(self.c,), tol=1e-12, max_iter=3)
+        self.assertEqual(exit_msg, 'reached max iterations')
+        self.assertTrue((x >= self.a).all() and (x <= self.b).all())
+
+    def test_newton_converges(self):
+        x, exit_msg = nrn._vectorized_newton(
+            self.func, self.fprime, self.b, self.a, self.b, args=(self.c,),
+            tol=1e-12)
+        self.assertTrue(exit_msg.startswith('reached tolerance'), exit_msg)
+        assert_allclose(x, np.sqrt(self.c), rtol=1e-9)
+
+    def test_newton_max_iter(self):
+        x, exit_msg = nrn._vectorized_newton(
+            self.func, self.fprime, self.b, self.a, self.b, args=(self.c,),
+            tol=1e-12, max_iter=2)
+        self.assertEqual(exit_msg, 'reached max iterations')
+        self.assertTrue((x >= self.a).all() and (x <= self.b).all())
+
+
+class TestALIFTuningCurve(unittest.TestCase):
+    def setUp(self):
+        self.params = dict(tau_m=.01, tref=.005, xt=1., af=.1, tau_f=.01)
+        self.u_in = np.linspace(0., 20., 41)
+
+    def test_num_alif_fi(self):
+        f = nrn.num_alif_fi(self.u_in, tol=1e-10, **self.params)
+        assert_allclose(f, ref_alif_fi(self.u_in, **self.params), rtol=1e-9)
+
+    def test_num_alif_fi_equal_taus(self):
+        # tau_f == tau_m takes the limit of the interspike time relation
+        self.params['tau_f'] = self.params['tau_m']
+        f = nrn.num_alif_fi(self.u_in, tol=1e-10, **self.params)
+        assert_allclose(f, ref_alif_fi(self.u_in, **self.params), rtol=1e-9)
+
+    def test_max_f_above_refractory_limit(self):
+        # no neuron fires faster than 1/tref, so larger max_f changes nothing
+        params = dict(tau_m=.02, tref=.002, xt=1., af=.1, tau_f=.01)
+        u_in = np.array([2., 5., 10.])
+        ref_f = ref_alif_fi(u_in, **params)
+        assert_allclose(ref_f, [21.37, 45.70, 86.19], atol=.01)
+        f, printed = capture_stdout(
+            nrn.num_alif_fi, u_in, max_f=1000., tol=1e-10, **params)
+        self.assertEqual(printed, '')
+        assert_allclose(f, ref_f, rtol=1e-9)
+        for method in ['bisect', 'newton', 'brentq']:
+            f = nrn.scipy_alif_fi(u_in, max_f=1000., method=method, **params)
+            assert_allclose(f, ref_f, rtol=1e-9)
+
+    def test_scipy_alif_fi(self):
+        ref_f = ref_alif_fi(self.u_in, **self.params)
+        for method in ['bisect', 'newton', 'brentq', brentq]:
+            f = nrn.scipy_alif_fi(self.u_in, method=method, **self.params)
+            assert_allclose(f, ref_f, rtol=1e-9)
+
+    def test_num_alif_fi_warns_on_max_iter(self):
+        f, printed = capture_stdout(
+            nrn.num_alif_fi, self.u_in, max_iter=3, **self.params)
+        self.assertIn('Warning (num_alif_fi)', printed)
+        f, printed = capture_stdout(nrn.num_alif_fi, self.u_in, **self.params)
+        self.assertEqual(printed, '')
+
+    def test_num_alif_fi_mu_apx_warns_on_max_iter(self):
+        f, printed = capture_stdout(
+            nrn.num_alif_fi_mu_apx, self.u_in, max_iter=1, **self.params)
+        self.assertIn('Warning (num_alif_fi_mu_apx)', printed)
+        f, printed = capture_stdout(
+            nrn.num_alif_fi_mu_apx, self.u_in, **self.params)
+        self.assertEqual(printed, '')
+
+
+class TestLIFTuningCurve(unittest.TestCase):
+    def setUp(self):
+        self.params = dict(tau=.02, tref=.002, xt=1.)
+
+    def test_fi(self):
+        u = np.linspace(0., 200., 2001)
+        assert_allclose(nrn.th_lif_fi(u, **self.params),
+                        ref_lif_fi(u, **self.params), rtol=1e-12)
+        assert_allclose(nrn.th_lif_fi(u, use_table=True, **self.params),
+                        ref_lif_fi(u, **self.params), rtol=1e-3)
+
+    def test_fi_nan(self):
+        u = np.array([np.nan, 2.])
+        f = nrn.th_lif_fi(u, **self.params)
+        self.assertEqual(f[0], 0.)
+        assert_allclose(f[1:], ref_lif_fi(u[1:], **self.params))
+
+    def test_taylor1(self):
+        a = np.array([1.1, 2., 10.])
+        k0, k1 = nrn.taylor1_lif_k0_k1(a, **self.params)
+        assert_allclose(k0 + k1*a, ref_lif_fi(a, **self.params), rtol=1e-12)
+        assert_allclose(k1, nrn.th_lif_dfdu(a, **self.params), rtol=1e-12)
+        assert_allclose(nrn.taylor1_lif_fi(2., a, **self.params),
+                        k0[1] + k1[1]*a, rtol=1e-12)
+
+    def test_round_trip(self):
+        f = np.linspace(5., 450., 446)
+        u = nrn.th_lif_if(f, **self.params)
+        assert_allclose(nrn.th_lif_fi(u, **self.params), f, rtol=1e-12)
+        u = nrn.th_lif_if(f, use_table=True, **self.params)
+        assert_allclose(nrn.th_lif_fi(u, use_table=True, **self.params), f,
+                        rtol=1e-9)
+        assert_allclose(nrn.th_lif_fi(u, **self.params), f, rtol=1e-3)
+
+    def test_table_matches_exact_at_table_edges(self):
+        for tau, tref, xt in [(.01, .005, 1.), (.02, .002, 1.)]:
+            table = nrn._LIFTable.get(tau, tref, xt)
+            u = np.array([0., xt])
+            assert_allclose(nrn.th_lif_fi(u, tau, tref, xt, use_table=True),
+                            0.)
+            u = np.array([1.001*xt, 1.01*xt, table.u_grid[-1]])
+            assert_allclose(nrn.th_lif_fi(u, tau, tref, xt, use_table=True),
+                            nrn.th_lif_fi(u, tau, tref, xt), rtol=1e-3)
+            assert_allclose(
+                nrn.th_lif_fi(table.u_grid[-1:], tau, tref, xt,
+                              use_table=True),
+                nrn.th_lif_fi(table.u_grid[-1:], tau, tref, xt), rtol=1e-12)
+
+
+class TestSynapse(unittest.TestCase):
+    def test_usyn_xminmax(self):
+        lam = np.array([0., .1, 1., 50., 1e4])
+        tau = .01
+        xmin, xmax = nrn.th_usyn_xminmax(lam, tau)
+        ref_xmax = np.zeros_like(lam)
+        ref_xmin = np.zeros_like(lam)
+        idx = lam > 0
+        ref_xmax[idx] = 1./(tau*(1.-np.exp(-1./(lam[idx]*tau))))
+        ref_xmin[idx] = np.exp(-1./(lam[idx]*tau))*ref_xmax[idx]
+        assert_allclose(xmax, ref_xmax, rtol=1e-12)
+        assert_allclose(xmin, ref_xmin, rtol=1e-12)
+        assert_array_equal(nrn.th_usyn_xmin(lam, tau), xmin)
+        assert_array_equal(nrn.th_usyn_xmax(lam, tau), xmax)
+        # a synapse driven by a uniform spike train oscillates between them
+        self.assertTrue((xmin[idx] < lam[idx]).all())
+        self.assertTrue((xmax[idx] > lam[idx]).all())
+
+
+class TestRunSoma(unittest.TestCase):
+    def setUp(self):
+        self.dt = 1e-4
+        self.tau = .02
+        self.tref = .002
+        self.xt = 1.
+        self.af = .1
+        self.tau_f = .01
+        rng = np.random.RandomState(0)
+        # a mix of constant and noisy inputs, some below threshold
+        u = np.linspace(0., 5., 8) + np.zeros((5000, 1))
+        self.u = u + rng.uniform(-.5, .5, size=u.shape)*(u > 2.)
+
+    def test_run_lifsoma(self):
+        spiketimes = nrn.run_lifsoma(
+            self.dt, self.u, self.tau, self.tref, self.xt)
+        ref_spiketimes = ref_run_alifsoma(
+            self.dt, self.u, self.tau, self.tref, self.xt, 0., self.tau_f)
+        assert_spiketimes_close(self, spiketimes, ref_spiketimes)
+
+    def test_run_lifsoma_state(self):
+        spiketimes, state = nrn.run_lifsoma(
+            self.dt, self.u[:, 3], self.tau, self.tref, self.xt,
+            ret_state=True)
+        self.assertEqual(state.shape, (len(self.u), 1))
+        self.assertTrue((state <= self.xt).all())
+        self.assertTrue(len(spiketimes) > 0)
+
+    def test_run_alifsoma(self):
+        spiketimes = nrn.run_alifsoma(
+            self.dt, self.u, self.tau, self.tref, self.xt, self.af,
+            self.tau_f)
+        ref_spiketimes = ref_run_alifsoma(
+            self.dt, self.u, self.tau, self.tref, self.xt, self.af,
+            self.tau_f)
+        assert_spiketimes_close(self, spiketimes, ref_spiketimes)
+
+    def test_0d_array_parameters(self):
+        spiketimes = nrn.run_alifsoma(
+            np.array(self.dt), self.u, np.array(self.tau), self.tref,
+            self.xt, self.af, np.array(self.tau_f))
+        ref_spiketimes = nrn.run_alifsoma(
+            self.dt, self.u, self.tau, self.tref, self.xt, self.af,
+            self.tau_f)
+        assert_spiketimes_close(self, spiketimes, ref_spiketimes)
+
+    def test_alif_fstate0(self):
+        # starting from the steady state feedback skips the transient, so the
+        # first interspike interval is already the steady state one
+        u_in = np.array([2., 5.])
+        f = nrn.num_alif_fi(u_in, self.tau, self.tref, self.xt, self.af,
+                            self.tau_f, tol=1e-10)
+        fstate0 = nrn._alif_fstate0(f, self.tref, self.tau_f)
+        dt = 1e-6
+        spiketimes = nrn.run_alifsoma(
+            dt, u_in + np.zeros((int(.1/dt), 1)), self.tau, self.tref,
+            self.xt, self.af, self.tau_f, fstate0=fstate0)
+        for spk_t, f_val in zip(spiketimes, f):
+            isi = np.diff(spk_t)
+            assert_allclose(isi, isi[-1], rtol=1e-3)
+            assert_allclose(1./isi[0], f_val, rtol=1e-2)
+
+    def test_empty_and_nan_inputs(self):
+        self.assertEqual(len(nrn.run_lifsoma(
+            self.dt, np.zeros((0, 3)), self.tau, self.tref, self.xt)), 3)
+        u = self.u.copy()
+        u[:, 0] = np.nan
+        spiketimes = nrn.run_alifsoma(
+            self.dt, u, self.tau, self.tref, self.xt, self.af, self.tau_f)
+        self.assertEqual(len(spiketimes[0]), 0)
+
+    def test_large_populations(self):
+        # populations above _NB_PARALLEL_MIN_NEURONS are dispatched to the
+        # parallel kernels when numba is installed
+        nneurons = nrn._NB_PARALLEL_MIN_NEURONS + 76
+        u = np.linspace(0., 5., nneurons) + np.zeros((200, 1))
+        ref_spiketimes = nrn._split_spiketimes(*nrn._run_lifsoma_np(
+            u, *nrn._lif_coeffs(self.dt, self.tau), tref=self.tref,
+            xt=self.xt, dt=self.dt, state=np.zeros((0, nneurons)),
+            nspikes_est=1), nneurons=nneurons)
+        assert_spiketimes_close(self, nrn.run_lifsoma(
+            self.dt, u, self.tau, self.tref, self.xt), ref_spiketimes)
+        assert_spiketimes_close(self, nrn.run_alifsoma(
+            self.dt, u, self.tau, self.tref, self.xt, 0., self.tau_f),
+            ref_spiketimes)
+
+    def run_lif_kernel(self, kernel, nspikes_est):
+        decay, increment = nrn._lif_coeffs(self.dt, self.tau)
+        state = np.zeros((0, self.u.shape[1]))
+        return kernel(self.u, decay, increment, self.tref, self.xt, self.dt,
+                      state, nspikes_est)
+
+    def run_alif_kernel(self, kernel, nspikes_est):
+        nneurons = self.u.shape[1]
+        decay, increment = nrn._lif_coeffs(self.dt, self.tau)
+        fdecay, fincrement = nrn._lif_coeffs(self.dt, self.tau_f)
+        V = np.zeros(nneurons)
+        Vf = np.zeros(nneurons)
+        state = np.zeros((0, nneurons))
+        return kernel(
+            self.u, decay, increment, np.zeros(nneurons) + fdecay,
+            np.zeros(nneurons) + fincrement, np.zeros(nneurons) + self.af,
+            self.tref, self.xt, self.dt, V, Vf, state, state, nspikes_est)
+
+    def assert_kernels_match(self, run_kernel, ref_kernel, kernels):
+        nspikes_est = nrn._est_nspikes(
+            self.dt, self.u, self.tau, self.tref, self.xt)
+        ref_idx, ref_t = run_kernel(ref_kernel, nspikes_est)
+        self.assertTrue(len(ref_t) > 1)
+        for kernel in kernels:
+            # buffers too small to hold the spikes grow as spikes arrive
+            for size in [nspikes_est, 1, 0]:
+                spike_idx, spike_t = run_kernel(kernel, size)
+                assert_array_equal(spike_idx, ref_idx)
+                assert_allclose(spike_t, ref_t, rtol=1e-12)
+
+    def compiled_kernels(self, name):
+        if nrn.numba is None:
+            self.skipTest('numba is not installed')
+        return [getattr(nrn, name + '_nb'), getattr(nrn, name + '_nb_par')]
+
+    def test_lif_kernel_buffer_growth(self):
+        self.assert_kernels_match(
+            self.run_lif_kernel, nrn._run_lifsoma_np, [nrn._run_lifsoma_np])
+
+    def test_alif_kernel_buffer_growth(self):
+        self.assert_kernels_match(
+            self.run_alif_kernel, nrn._run_alifsoma_np,
+            [nrn._run_alifsoma_np])
+
+    def test_compiled_lif_kernels(self):
+        self.assert_kernels_match(
+            self.run_lif_kernel, nrn._run_lifsoma_np,
+            self.compiled_kernels('_run_lifsoma'))
+
+    def test_compiled_alif_kernels(self):
+        self.assert_kernels_match(
+            self.run_alif_kernel, nrn._run_alifsoma_np,
+            self.compiled_kernels('_run_alifsoma'))
+
+
+class TestSimTuningCurve(unittest.TestCase):
+    def setUp(self):
+        self.dt = 1e-4
+        self.params = (.02, .002, 1.)  # tau_m, tref, xt
+
+    def cold_start_alif_f(self, u_in, af, tau_f, run_time):
+        """Rates from the last ISI of long simulations from zero feedback"""
+        spiketimes = nrn.run_alifsoma(
+            self.dt, u_in + np.zeros((int(run_time/self.dt), 1)),
+            *self.params, af=af, tau_f=tau_f, flatten1=False)
+        return np.array([1./np.diff(spk_t[-2:])[0] for spk_t in spiketimes])
+
+    def test_sim_lif_fi(self):
+        u = np.array([0., .5, 1., 1.01, 1.5, 3., 10.])
+        f = nrn.sim_lif_fi(self.dt, u, *self.params)
+        assert_allclose(f, ref_sim_lif_fi(self.dt, u, *self.params),
+                        rtol=1e-3)
+        assert_array_equal(f[:3], 0.)
+        assert_allclose(f[3:], ref_lif_fi(u[3:], *self.params), rtol=.01)
+
+    def test_sim_alif_fi(self):
+        # every input is simulated in one batch of neurons with its own
+        # feedback parameters, each compared to a separate cold start
+        u_in = np.array([0., .5, 1.5, 3., 5.])
+        af = np.array([.1, .1, .1, .5, .05])
+        tau_f = np.array([.01, .01, .05, .01, .1])
+        f = nrn.sim_alif_fi(self.dt, u_in, *self.params, af=af, tau_f=tau_f)
+        assert_array_equal(f[:2], 0.)
+        for i in range(2, len(u_in)):
+            ref_f = self.cold_start_alif_f(
+                u_in[i:i+1], af[i], tau_f[i], 10.*tau_f[i]+.5)
+            assert_allclose(f[i], ref_f, rtol=.002)
+        num_f = nrn.num_alif_fi(u_in, *self.params, af=af, tau_f=tau_f)
+        assert_allclose(f, num_f, rtol=.02)
+
+    def array_dt_case(self):
+        u_in = np.array([1.5, 3., 0., 5., 2., 4.])
+        dt = np.array([1e-4, 5e-5, 1e-4, 1e-4, 5e-5, 2e-4])
+        af = np.linspace(.05, .3, len(u_in))
+        return u_in, dt, af, .02
+
+    def test_sim_alif_fi_array_dt(self):
+        # inputs sharing a dt are simulated together, and each must get the
+        # same result as simulating its group with a scalar dt. num_alif_fi
+        # stops once all of its inputs are within tol, so the starting
+        # states differ slightly with the group
+        u_in, dt, af, tau_f = self.array_dt_case()
+        f = nrn.sim_alif_fi(dt, u_in, *self.params, af=af, tau_f=tau_f,
+                            max_proc=0)
+        for dt_val in np.unique(dt):
+            idx = dt == dt_val
+            assert_allclose(f[idx], nrn.sim_alif_fi(
+                dt_val, u_in[idx], *self.params, af=af[idx], tau_f=tau_f),
+                rtol=1e-6)
+        self.assertEqual(f[2], 0.)
+        assert_allclose(f, nrn.num_alif_fi(u_in, *self.params, af=af,
+                                           tau_f=tau_f), rtol=.02)
+
+    def test_sim_alif_fi_pool(self):
+        # groups finish out of order in the pool but must land on their
+        # own inputs
+        u_in, dt, af, tau_f = self.array_dt_case()
+        f = nrn.sim_alif_fi(dt, u_in, *self.params, af=af, tau_f=tau_f,
+                            max_proc=0)
+        try:
+            assert_array_equal(f, nrn.sim_alif_fi(
+                dt, u_in, *self.params, af=af, tau_f=tau_f, max_proc=2))
+        finally:
+            nrn._close_pool()
+
+    def test_pool_reuse(self):
+        try:
+            pool = nrn._get_pool(2)
+            self.assertIs(nrn._get_pool(2), pool)
+            u_in, dt, af, tau_f = self.array_dt_case()
+            nrn.sim_alif_fi(dt, u_in, *self.params, af=af, tau_f=tau_f,
+                            max_proc=2)
+            self.assertIs(nrn._get_pool(2), pool)
+            # a different number of processes replaces the pool
+            pool3 = nrn._get_pool(3)
+            self.assertIsNot(pool3, pool)
+            self.assertEqual(nrn._pool_nproc, 3)
+            # closing resets it, and the next call starts a new one
+            nrn._close_pool()
+            self.assertIsNone(nrn._pool)
+            self.assertIsNot(nrn._get_pool(3), pool3)
+        finally:
+            nrn._close_pool()
+
+    def test_sim_alif_fi_independent_of_hint(self):
+        # weak, slow adaptation makes the rate sensitive to the feedback
+        # state the simulation starts from
+        u_in = np.array([1.5, 3., 5.])
+        af, tau_f = .01, .5
+        ref_f = self.cold_start_alif_f(u_in, af, tau_f, 10.)
+        num_f = nrn.num_alif_fi(u_in, *self.params, af=af, tau_f=tau_f)
+        for scale in [.5, 2.]:
+            f = nrn.sim_alif_fi(self.dt, u_in, *self.params, af=af,
+                                tau_f=tau_f, num_af_hint=scale*num_f)
+            assert_allclose(f, ref_f, rtol=.002)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,9 +1,9 @@
 # utility functions for LIF_neuron.ipynb
 import numpy as np
 import multiprocessing
-from signal import make_poisson_spikes, filter_spikes
-from neuron import th_lif_fi, run_lifsoma, th_usyn_xmin, th_usyn_xmax
-from plot import (
+from .signal import make_poisson_spikes, filter_spikes
+from .neuron import th_lif_fi, run_lifsoma, th_usyn_xminmax
+from .plot import (
     plot_continuous, plot_spike_raster, plot_histogram,
     plot_contour, plot_scatter, match_xlims, save_close_fig)
 from scipy.special import erf
@@ -55,8 +55,9 @@ class LIF_IO_Collector(object):
         fexc = fexc_finh[0]
         finh = fexc_finh[1]
 
-        fexc_nspikes = 2.*self.T*fexc
-        finh_nspikes = 2.*self.T*finh
+        # spike counts are sizes, so round up to ints
+        fexc_nspikes = int(np.ceil(2.*self.T*fexc))
+        finh_nspikes = int(np.ceil(2.*self.T*finh))
         fexc_spks_in = self.spike_fun(fexc, fexc_nspikes, rng)
         finh_spks_in = self.spike_fun(finh, finh_nspikes, rng)
         t, fexc_in = filter_spikes(self.dt, self.T, fexc_spks_in,
@@ -98,8 +99,8 @@ class LIF_IO_Collector(object):
         if max_proc is not None:
             n_proc = min(n_proc, max_proc)
 
-        if n_proc == 1:
-            results = map(self._compute_stats, fexc_finh)
+        if n_proc <= 1:
+            results = list(map(self._compute_stats, fexc_finh))
         else:
             worker_pool = multiprocessing.Pool(
                 processes=n_proc, initializer=_set_io_collector,
@@ -130,7 +131,8 @@ def noisy_tuning(dt, T, max_u, max_f, k_trans, nsamples, max_proc,
     T += k_trans*tausyn
     T_ss = T - k_trans*tausyn
 
-    u_th = np.sort(np.linspace(0, max_u, 100).tolist() + [xt, 1.01*xt])
+    u_th = np.sort(np.concatenate((np.linspace(0, max_u, 100),
+                                   [xt, 1.01*xt])))
     fi = th_lif_fi(u_th, taum, tref, xt)
     fig, ax = plot_continuous(
         u_th, fi, plotp={'color': 'b', 'linewidth': 2, 'label': '$a(E[u])$'},
@@ -149,8 +151,7 @@ def noisy_tuning(dt, T, max_u, max_f, k_trans, nsamples, max_proc,
     tuning, dev_l, dev_u = io_collector.collect_io_stats(
         fexc=f, finh=None, ret_devs=True, max_proc=max_proc)
 
-    xmin_th = th_usyn_xmin(tuning, taufilt)
-    xmax_th = th_usyn_xmax(tuning, taufilt)
+    xmin_th, xmax_th = th_usyn_xminmax(tuning, taufilt)
     xmin_dev_th = (tuning-xmin_th).reshape((1, -1))
     xmax_dev_th = (xmax_th-tuning).reshape((1, -1))
     xmin_xmax_dev_th = np.vstack((xmin_dev_th, xmax_dev_th))
@@ -311,7 +312,7 @@ def _worker_lif_stats(uf):
 
     fig = plt.figure(figsize=(16, 6))
     ax = [fig.add_subplot(4, 2, 1)]
-    for i in xrange(1, 4):
+    for i in range(1, 4):
         ax.append(fig.add_subplot(4, 2, i*2+1))
 
     th_f = th_lif_fi(u, tau_m, tref, xt)
@@ -319,7 +320,7 @@ def _worker_lif_stats(uf):
     if th_f > 0:
         T = max(T, tgt_outspikes/th_f)
 
-    nspikes = max(10, 2.*T*rate)
+    nspikes = int(max(10, 2.*T*rate))
     spks_in = make_poisson_spikes(rate, nspikes, rng)
     plot_spike_raster(spks_in, ax=ax[0], yticks=[])
 
@@ -389,9 +390,10 @@ def lif_stats(u, dt=.0001, max_f=1000., xlim_T=1.,
     worker_init_args = (
         dt, alpha, xlim_T, fname, close, tgt_outspikes, neuronp)
 
-    if n_processes == 1:
+    if n_processes <= 1:
         _worker_init(*worker_init_args)
-        map(_worker_lif_outstats, zip(u, f))
+        for uf in zip(u, f):
+            _worker_lif_stats(uf)
     else:
         worker_pool = multiprocessing.Pool(
             processes=n_processes, initializer=_worker_init,
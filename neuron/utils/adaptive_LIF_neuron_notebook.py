@@ -1,10 +1,11 @@
+import math
 import numpy as np
 from matplotlib.pyplot import figure
 from multiprocessing import Pool, cpu_count
-from neuron import (
-    th_lif_fi, th_lif_if, num_alif_fi, num_alif_fi_mu_apx, sim_alif_fi,
-    run_alifsoma)
-from signal import filter_spikes
+from .neuron import (
+    th_lif_fi, th_lif_if, taylor1_lif_k0_k1, num_alif_fi, num_alif_fi_mu_apx,
+    sim_alif_fi, run_alifsoma)
+from .signal import filter_spikes
 
 
 def demo_adaptive_intuition(title_str='', k=None, tau_adapt=None):
@@ -25,7 +26,7 @@ def demo_adaptive_intuition(title_str='', k=None, tau_adapt=None):
         decay = np.exp(-dt)
         increment = 1-decay
         x3 = np.zeros(n)
-        for i in xrange(1, n):
+        for i in range(1, n):
             x3[i] = decay*x3[i-1]+increment*u3[i]
         ylim = (0, k*u1_val*1.1)
 
@@ -54,64 +55,69 @@ def demo_adaptive_intuition(title_str='', k=None, tau_adapt=None):
     ax.set_ylabel('input', fontsize=18)
 
 
-def sim_vs_num_tauf(dt, T, max_u, taum, tref, xt, af, tauf, ax=None):
-    n = len(tauf)
+def _sweep_alif(dt, max_u, taum, tref, xt, af, tauf, sweep, ax=None):
+    """Plots simulated vs numerical adaptive LIF tuning curves over a sweep
+
+    sweep names the swept parameter, 'af' or 'tauf', which is given as an
+    array of values while the other parameter is fixed
+    """
+    assert sweep in ('af', 'tauf'), "sweep must be 'af' or 'tauf'"
+    sweep_vals = np.asarray(af if sweep == 'af' else tauf, dtype=float)
+    n = len(sweep_vals)
     if ax is None:
         fig = figure(figsize=(8, 6))
         ax = fig.add_subplot(111)
-    cc = [(0, 0, .5*float(i)/n+.5) for i in xrange(n)]
+    cc = [(0, 0, .5*float(i)/n+.5) for i in range(n)]
 
     th_max_f = 1./tref
-    u = np.array(np.sort(np.linspace(0, max_u, 100).tolist() +
-                         [xt, 1.001*xt, 1.01*xt, 1.1*xt]))
+    u = np.sort(np.concatenate((np.linspace(0, max_u, 100),
+                                [xt, 1.001*xt, 1.01*xt, 1.1*xt])))
     lif_fi = th_lif_fi(u, taum, tref, xt)
     max_f = max(lif_fi)
     f = np.linspace(5., max_f, 10)
     _u = th_lif_if(f, taum, tref, xt)  # linear in firing rate
 
+    # one row per sweep value, one column per input, solving for u and _u
+    # together
+    u_all = np.concatenate((u, _u))
+    af_all = np.zeros((n, len(u_all))) + (
+        sweep_vals[:, None] if sweep == 'af' else af)
+    tauf_all = np.zeros((n, len(u_all))) + (
+        sweep_vals[:, None] if sweep == 'tauf' else tauf)
+    num_af = num_alif_fi(np.tile(u_all, n), taum, tref, xt, af_all.ravel(),
+                         tauf_all.ravel(), max_f=max_f).reshape(n, -1)
+    num_af, num_af_u = num_af[:, :len(u)], num_af[:, len(u):]
+
+    # simulate every (sweep value, _u) pair together as one batch of neurons
+    sim_af = sim_alif_fi(dt, np.tile(_u, n), taum, tref, xt,
+                         af_all[:, len(u):].ravel(),
+                         tauf_all[:, len(u):].ravel(),
+                         num_af_hint=num_af_u.ravel()).reshape(n, -1)
+
+    if sweep == 'af':
+        label = r'$\alpha_f=%.3f$'
+        title = r'$\tau=%.3f$, $\tau_f=%.3f$' % (taum, tauf)
+    else:
+        label = r'$\tau_f=%.3f$'
+        title = r'$\tau=%.3f$, $\alpha_f=%.3f$' % (taum, af)
     ax.plot(u, lif_fi, 'k', lw=2, label='nonadaptive LIF')
-    for idx, tauf_val in enumerate(tauf):
-        sim_af = sim_alif_fi(dt, _u, taum, tref, xt, af, tauf_val)
-        num_af = num_alif_fi(u, taum, tref, xt, af, tauf_val, max_f=max_f)
-        ax.plot(_u, sim_af, 'o', mfc=cc[idx], ms=8, alpha=.5)
-        ax.plot(u, num_af, c=cc[idx], lw=2,
-                label=r'$\tau_f=%.3f$' % (tauf_val))
+    for idx, val in enumerate(sweep_vals):
+        ax.plot(u, num_af[idx], c=cc[idx], lw=2, label=label % val)
+        ax.plot(_u, sim_af[idx], 'o', mfc=cc[idx], ms=8, alpha=.5)
     ax.set_ylim(0, th_max_f)
     ax.set_xlim(0, max_u*1.001)
     ax.legend(loc='upper left')
     ax.set_xlabel(r'$u_{in}$', fontsize=20)
     ax.set_ylabel(r'$f$ (spks / s)', fontsize=20)
-    ax.set_title(r'$\tau=%.3f$, $\alpha_f=%.3f$' % (taum, af), fontsize=20)
+    ax.set_title(title, fontsize=20)
 
 
-def sim_vs_num_af(dt, T, max_u, taum, tref, xt, af, tauf, ax=None):
-    n = len(af)
-    if ax is None:
-        fig = figure(figsize=(8, 6))
-        ax = fig.add_subplot(111)
-    cc = [(0, 0, .5*float(i)/n+.5) for i in xrange(n)]
+def sim_vs_num_tauf(dt, T, max_u, taum, tref, xt, af, tauf, ax=None):
+    _sweep_alif(dt, max_u, taum, tref, xt, af, tauf, 'tauf', ax)
 
-    th_max_f = 1./tref
-    u = np.array(np.sort(np.linspace(0, max_u, 100).tolist() +
-                         [xt, 1.001*xt, 1.01*xt, 1.1*xt]))
-    lif_fi = th_lif_fi(u, taum, tref, xt)
-    max_f = max(lif_fi)
-    f = np.linspace(5., max_f, 10)
-    _u = th_lif_if(f, taum, tref, xt)  # linear in firing rate
 
-    ax.plot(u, lif_fi, 'k', lw=2, label='nonadaptive LIF')
-    for idx, af_val in enumerate(af):
-        sim_af = sim_alif_fi(dt, _u, taum, tref, xt, af_val, tauf)
-        num_af = num_alif_fi(u, taum, tref, xt, af_val, tauf, max_f=max_f)
-        ax.plot(u, num_af, c=cc[idx], lw=2,
-                label=r'$\alpha_f=%.3f$' % (af_val))
-        ax.plot(_u, sim_af, 'o', mfc=cc[idx], ms=8, alpha=.5)
-    ax.set_ylim(0, th_max_f)
-    ax.set_xlim(0, max_u*1.001)
-    ax.legend(loc='upper left')
-    ax.set_xlabel(r'$u_{in}$', fontsize=20)
-    ax.set_ylabel(r'$f$ (spks / s)', fontsize=20)
-    ax.set_title(r'$\tau=%.3f$, $\tau_f=%.3f$' % (taum, tauf), fontsize=20)
+def sim_vs_num_af(dt, T, max_u, taum, tref, xt, af, tauf, ax=None):
+    _sweep_alif(dt, max_u, taum, tref, xt, af, tauf, 'af', ax)
 
 
 def _af_tauf_sweep_worker(args):
@@ -121,14 +127,13 @@ def _af_tauf_sweep_worker(args):
 def _af_tauf_sweep_worker_unwrapped(dt, uin, taum, tref, xt, af, tauf, tausyn):
     if tausyn is None:
         tausyn = tauf
-    T = max([4.*tauf, 4.*tausyn,
-             2.0/num_alif_fi(uin, taum, tref, xt, af, tauf)])
+    f_ss = num_alif_fi(uin, taum, tref, xt, af, tauf)
+    T = max([4.*tauf, 4.*tausyn, 2.0/f_ss])
     nsteps = int(np.ceil(T/dt))
     t = np.arange(nsteps)*dt
     u = np.zeros(nsteps)+uin
     f_init = th_lif_fi(uin, taum, 0., xt)
     isi_init = 1./f_init
-    f_ss = num_alif_fi(uin, taum, tref, xt, af, tauf)
     isi_ss = 1./f_ss
     n_ss_spks = int(np.ceil(T/isi_ss))
     f_ss_spk_times = isi_ss*np.arange(n_ss_spks)+isi_init
@@ -136,7 +141,7 @@ def _af_tauf_sweep_worker_unwrapped(dt, uin, taum, tref, xt, af, tauf, tausyn):
     e_x_syn = np.zeros(t.shape)
     idx = t > isi_init
     e_x_syn[idx] = f_ss*(1-np.exp(-(t[idx]-isi_init)/tausyn))
-    alif_spk_times = run_alifsoma(dt, u, taum, tref, xt, af=af, tauf=tauf)
+    alif_spk_times = run_alifsoma(dt, u, taum, tref, xt, af=af, tau_f=tauf)
     ax_syn = filter_spikes(dt, T, alif_spk_times, tausyn, ret_time=False)
     ret = dict(t=t, T=T, af=af, tauf=tauf, tausyn=tausyn, f_ss=f_ss,
                ax_syn=ax_syn, x_syn=x_syn, e_x_syn=e_x_syn)
@@ -151,9 +156,9 @@ def af_tauf_sweep(dt, uin, taum, tref, xt, afs, taufs, tausyn=None,
               for tauf in taufs for af in afs]
 
     fig = figure(figsize=(16, 12))
-    axs = [fig.add_subplot(n_tauf, n_af, i+1) for i in xrange(n_af*n_tauf)]
+    axs = [fig.add_subplot(n_tauf, n_af, i+1) for i in range(n_af*n_tauf)]
     if (max_proc in (None, 0, 1)) or (len(params) == 1):
-        results = map(_af_tauf_sweep_worker, params)
+        results = list(map(_af_tauf_sweep_worker, params))
     else:
         workers = Pool(max_proc)
         results = workers.map(_af_tauf_sweep_worker, params)
@@ -180,26 +185,20 @@ def af_tauf_sweep(dt, uin, taum, tref, xt, afs, taufs, tausyn=None,
         fig.text(.48, .93, suptitle, fontsize=20)
 
 
-def taylor1_lif_k0_k1(a, tau, tref, xt):
-    k1 = tau*xt/((tref-tau*np.log(1-xt/a))**2*a*(a-xt))
-    k0 = th_lif_fi(a, tau, tref, xt) - k1*a
-    return k0, k1
-
-
 def taylor1_alif_fi(u, tau_m, tref, xt, af, tau_f):
-    af *= np.exp(-tref/tau_f)
+    af_eff = af*math.exp(-tref/tau_f)  # feedback scaling seen by the soma
     f = np.zeros(u.shape)
     idx = u > xt
     k0, k1 = taylor1_lif_k0_k1(u[idx], tau_m, tref, xt)
-    f[idx] = (k0+k1*u[idx])/(1+k1*af)
+    f[idx] = (k0+k1*u[idx])/(1+k1*af_eff)
     return f
 
 
 def compare_mu_apx(max_u, tau_m, tref, xt, af, tau_f):
     th_max_f = 1./tref
     # inputs
-    u = np.array(np.sort(np.linspace(0, max_u, 100).tolist() + [xt]))
-    max_f = th_lif_fi(max_u, tau_m, tref, xt)
+    u = np.sort(np.concatenate((np.linspace(0, max_u, 100), [xt])))
+    max_f = th_lif_fi(max_u, tau_m, tref, xt)[0]
     f = np.linspace(5., max_f, 13)
     u_pts = th_lif_if(f, tau_m, tref, xt)  # linear in firing rate
 
@@ -232,24 +231,23 @@ def compare_mu_apx(max_u, tau_m, tref, xt, af, tau_f):
     ax.set_ylabel(r'$f(u_{in})$ (spks / s)', fontsize=20)
 
     # fg linear approximation
+    af_eff = af*math.exp(-tref/tau_f)  # feedback scaling seen by the soma
     uf_f = np.linspace(0, th_max_f, 201)
-    uf = af*np.exp(-tref/tau_f)*uf_f
+    uf = af_eff*uf_f
     k0, k1 = taylor1_lif_k0_k1(u_pts, tau_m, tref, xt)
-    taylor1_f_uf = np.zeros((u_pts.shape[0], uf.shape[0]))
-    for idx, u_val in enumerate(u_pts):
-        taylor1_f_uf[idx, :] = k0[idx]+k1[idx]*u_val-k1[idx]*uf
+    # one row per u_pts value
+    f_ss = th_lif_fi(u_pts[:, None] - uf[None, :], tau_m, tref, xt)
+    taylor1_f_uf = (k0+k1*u_pts)[:, None] - k1[:, None]*uf[None, :]
 
-    uf_alif = af*np.exp(-tref/tau_f)*pts_alif_fi
-    uf_alif_mu_apx = af*np.exp(-tref/tau_f)*pts_alif_fi_mu_apx
-    uf_alif_mu_apx_taylor1 = af*np.exp(-tref/tau_f)*pts_alif_fi_mu_apx_taylor1
+    uf_alif = af_eff*pts_alif_fi
+    uf_alif_mu_apx = af_eff*pts_alif_fi_mu_apx
+    uf_alif_mu_apx_taylor1 = af_eff*pts_alif_fi_mu_apx_taylor1
 
     # plot fg curves
-    cc = [(float(i)/len(u_pts), 0, 0) for i in xrange(len(u_pts))]
+    cc = [(float(i)/len(u_pts), 0, 0) for i in range(len(u_pts))]
     ax = fig.add_subplot(122)
     for idx, u_val in enumerate(u_pts):
-        net_u = u_val - uf
-        f_ss = th_lif_fi(net_u, tau_m, tref, xt)
-        line = ax.plot(uf, f_ss, color=cc[idx])[0]
+        line = ax.plot(uf, f_ss[idx, :], color=cc[idx])[0]
         if u_val in (u_pts[0], u_pts[-1]):
             line.set_label(r'$u_{in}=%.2f$' % u_val)
         ax.plot(uf, taylor1_f_uf[idx, :], color=cc[idx], ls=':')
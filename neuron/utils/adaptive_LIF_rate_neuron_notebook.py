@@ -1,13 +1,13 @@
 import numpy as np
 from matplotlib import pyplot as plt
-from neuron import (
+from .neuron import (
     th_lif_fi, th_lif_if, th_lif_dfdu, th_ralif_if, th_ralif_dfdt,
     num_alif_fi, num_ralif_fi, run_ralifsoma,
     run_lifsoma, run_alifsoma)
-from plot import make_blue_cmap, make_red_cmap, make_color_cycle
-from signal import filter_spikes
+from .plot import make_blue_cmap, make_red_cmap, make_color_cycle
+from .signal import filter_spikes
 from nengo.synapses import filt
-from data import scalar_to_array
+from .data import scalar_to_array
 
 
 def phase_u_f(tau_m, tref, xt, af, tau_f, dt=1e-4, max_u=5., u_in=3.5,
@@ -17,7 +17,7 @@ def phase_u_f(tau_m, tref, xt, af, tau_f, dt=1e-4, max_u=5., u_in=3.5,
         return 1./tau_f * (-u_net + u_in - af*f)
 
     min_f = 10.
-    _u = np.sort(np.linspace(0, max_u, 100).tolist() + [xt, xt*1.001])
+    _u = np.sort(np.concatenate((np.linspace(0, max_u, 100), [xt, xt*1.001])))
     _f = th_lif_fi(_u, tau_m, tref, xt)
     max_f = 1./tref
 
@@ -409,10 +409,10 @@ def gradcheck_J(u_in, u_net, f, tau_m, xt, af, tau_f):
     J21_f = lambda x: _J21(af, tau_f)
     J22_u_net = lambda x: _J22(tau_f)
 
-    print grad_check(f1_f, J11_f, f)
-    print grad_check(f1_u_net, J12_u_net, u_net)
-    print grad_check(f2_f, J21_f, f)
-    print grad_check(f2_u_net, J22_u_net, u_net)
+    print(grad_check(f1_f, J11_f, f))
+    print(grad_check(f1_u_net, J12_u_net, u_net))
+    print(grad_check(f2_f, J21_f, f))
+    print(grad_check(f2_u_net, J22_u_net, u_net))
 
 
 def plotcheck_J(tau_m, tref, xt, af, tau_f, dt, u_in=3.5):
@@ -501,7 +501,7 @@ def contraction_analysis(u_in, tau_m, tref, xt, af, tau_f, dt=1e-4):
     evals = np.zeros((n, 2))
     proj = np.zeros((n, 2))
     evects = (np.zeros((n, 2)), np.zeros((n, 2)))
-    for i in xrange(n):
+    for i in range(n):
         J = J_ralif(u_in, u_net[i], f[i], tau_m, xt, af, tau_f)
         J_sym = .5*(J+J.T)
         lam, v = np.linalg.eigh(J_sym)
@@ -537,7 +537,7 @@ def contraction_analysis(u_in, tau_m, tref, xt, af, tau_f, dt=1e-4):
 def plot_traj(t, u_net, f, delta, tau_m, tref, xt):
     fig = plt.figure(figsize=(12, 4))
     ax = fig.add_subplot(121)
-    u_lif = np.sort(np.linspace(0, 5, 50).tolist() + [xt, 1.01*xt])
+    u_lif = np.sort(np.concatenate((np.linspace(0, 5, 50), [xt, 1.01*xt])))
     f_lif = th_lif_fi(u_lif, tau_m, tref, xt)
     ax.plot(u_lif, f_lif, 'k', label='open loop')
     ax.plot(u_net, f, 'mo', label=r'$f(u_{net}(t))$')
@@ -1,14 +1,30 @@
 # define neuron models
+import atexit
+import math
 import numpy as np
-from scipy.optimize import bisect
+from scipy.optimize import brentq
+import multiprocessing.util
 from multiprocessing import Pool, cpu_count
-from data import scalar_to_array
+from .data import scalar_to_array
+try:  # numba is optional. Without it, neurons are simulated with numpy
+    import numba
+    from numba import prange
+except ImportError:
+    numba = None
+    prange = range
+
+# compiled neuron simulations only use threads for populations larger than
+# this. Below it, the per time step thread launch overhead dominates
+_NB_PARALLEL_MIN_NEURONS = 1024
+
+# number of points in the LIF tuning curve lookup tables
+_LIF_TABLE_SIZE = 4096
 
 
 ###############################################################################
 # theoretical and theoretical approximations of input, firing rate relations ##
 ###############################################################################
-def th_lif_fi(u, tau, tref, xt):
+def th_lif_fi(u, tau, tref, xt, use_table=False):
     """Theoretical LIF tuning curve
 
     Calculates firing rate from input with
@@ -25,12 +41,51 @@ def th_lif_fi(u, tau, tref, xt):
         refractory period
     xt : float
         threshold
+    use_table : boolean (optional)
+        whether to linearly interpolate a precomputed table of the tuning
+        curve instead of evaluating it exactly. See _LIFTable
     """
     u = scalar_to_array(u)
-    f = np.zeros_like(u)
-    idx = u > xt
-    f[idx] = (tref-tau*np.log(1.-xt/u[idx]))**-1.
-    return f
+    if use_table:
+        return _LIFTable.get(tau, tref, xt).fi(u)
+    return _th_lif_fi_arr(u, tau, tref, xt)
+
+
+def _th_lif_fi_arr(u, tau, tref, xt):
+    """th_lif_fi for array u
+
+    Evaluates the tuning curve in a single pass over u. Inputs at or below
+    threshold are clamped just above it to keep the log finite, and their
+    rates are then set to 0.
+    """
+    if numba is not None:
+        return _th_lif_fi_nb(u, tau, tref, xt)
+    u_clamped = np.maximum(u, xt*(1+1e-15))
+    f = 1./(tref-tau*np.log1p(-xt/u_clamped))
+    return np.where(u > xt, f, 0.)
+
+
+def taylor1_lif_k0_k1(a, tau, tref, xt):
+    """Coefficients of the first order Taylor series of the LIF tuning curve
+
+    Returns k0 and k1 such that f(u) is approximately k0 + k1*u near u=a
+
+    Parameters
+    ----------
+    a: array-like of floats or float
+        input value(s) around which to approximate (must be > xt)
+    tau : float
+        membrane time constant
+    tref : float
+        refractory period
+    xt : float
+        threshold
+    """
+    # f(a) and its slope share the interspike interval, so take the log once
+    denom = tref-tau*np.log1p(-xt/a)
+    k1 = tau*xt/(denom*denom*a*(a-xt))
+    k0 = 1./denom - k1*a
+    return k0, k1
 
 
 def taylor1_lif_fi(a, u, tau, tref, xt, clip_subxt=False):
@@ -53,15 +108,14 @@ def taylor1_lif_fi(a, u, tau, tref, xt, clip_subxt=False):
     """
     assert a > xt, "a must be > xt"
     u = scalar_to_array(u)
-    k1 = tau*xt/((tref-tau*np.log(1-xt/a))**2*a*(a-xt))
-    k0 = th_lif_fi(a, tau, tref, xt) - k1*a
+    k0, k1 = taylor1_lif_k0_k1(a, tau, tref, xt)
     f = k0 + k1*u
     if clip_subxt:
         f[f < 0.] = 0.
     return f
 
 
-def th_lif_if(f, tau, tref, xt):
+def th_lif_if(f, tau, tref, xt, use_table=False):
     """Theoretically invert the LIF tuning curve
 
     Parameters
@@ -74,15 +128,76 @@ def th_lif_if(f, tau, tref, xt):
         refractory period
     xt : float
         threshold
+    use_table : boolean (optional)
+        whether to linearly interpolate a precomputed table of the tuning
+        curve instead of evaluating it exactly. See _LIFTable
 
     Returns the input that produced the given firing rates.
     """
     f = scalar_to_array(f)
     assert (f > 0.).all(), "LIF tuning curve only invertible for f>0."
-    u = xt/(1-np.exp((tref-1./f)/tau))
+    if use_table:
+        return _LIFTable.get(tau, tref, xt).inv(f)
+    return _th_lif_if_arr(f, tau, tref, xt)
+
+
+def _th_lif_if_arr(f, tau, tref, xt):
+    """th_lif_if for array f > 0"""
+    if numba is not None:
+        return _th_lif_if_nb(f, tau, tref, xt)
+    u = -xt/np.expm1((tref-1./f)/tau)  # expm1 stays accurate for large f
     return u
 
 
+class _LIFTable(object):
+    """Lookup table of the LIF tuning curve for linear interpolation
+
+    The table spans inputs from xt to 100*xt on a grid uniform in firing
+    rate, which places more points near threshold where the tuning curve is
+    steepest. Inputs and firing rates beyond the table are evaluated
+    exactly. Tables are memoized by (tau, tref, xt, size).
+    """
+    _tables = {}
+
+    def __init__(self, tau, tref, xt, size=_LIF_TABLE_SIZE):
+        self.tau = tau
+        self.tref = tref
+        self.xt = xt
+        f_max = _th_lif_fi_arr(np.array([100.*xt]), tau, tref, xt)[0]
+        f_grid = np.linspace(0., f_max, size)[1:]
+        u_grid = _th_lif_if_arr(f_grid, tau, tref, xt)
+        # the lowest rates invert to exactly xt once the exponential
+        # underflows. Keep only the (xt, 0) anchor at threshold so that
+        # interpolation there returns 0 like the exact tuning curve
+        above = u_grid > xt
+        self.f_grid = np.concatenate(([0.], f_grid[above]))
+        self.u_grid = np.concatenate(([xt], u_grid[above]))
+
+    @classmethod
+    def get(cls, tau, tref, xt, size=_LIF_TABLE_SIZE):
+        """Returns the memoized table for the given LIF parameters"""
+        key = (tau, tref, xt, size)
+        if key not in cls._tables:
+            cls._tables[key] = cls(tau, tref, xt, size)
+        return cls._tables[key]
+
+    def fi(self, u):
+        """Interpolated th_lif_fi"""
+        f = np.interp(u, self.u_grid, self.f_grid, left=0.)
+        beyond = u > self.u_grid[-1]
+        if beyond.any():
+            f[beyond] = _th_lif_fi_arr(u[beyond], self.tau, self.tref, self.xt)
+        return f
+
+    def inv(self, f):
+        """Interpolated th_lif_if"""
+        u = np.interp(f, self.f_grid, self.u_grid)
+        beyond = f > self.f_grid[-1]
+        if beyond.any():
+            u[beyond] = _th_lif_if_arr(f[beyond], self.tau, self.tref, self.xt)
+        return u
+
+
 def _th_lif_dfdu(u, f, tau, tref, xt, out):
     out = f**2 * tau * xt / (u * (u-xt))
     return out
@@ -167,40 +282,245 @@ def th_ralif_dfdt(u_net, u_in, f, tau_m, tref, xt, af, tau_f, ret_dudt=False):
         return dfdt
 
 
+def th_usyn_xminmax(lam, tau):
+    """Theoretical steady state xmin and xmax for synapse with uniform input
+
+    xmin is xmax decayed over one interspike interval, so both come from a
+    single exponential
+    """
+    xmin = np.zeros(len(lam))
+    xmax = np.zeros(len(lam))
+    idx = lam > 0
+    decay = np.exp(-1./(lam[idx]*tau))
+    xmax[idx] = 1./(tau*(1.-decay))
+    xmin[idx] = decay*xmax[idx]
+    return xmin, xmax
+
+
 def th_usyn_xmin(lam, tau):
     """Theoretical steady state xmin for synapse with uniform input"""
-    ret = np.zeros(len(lam))
-    idx = lam > 0
-    ret[idx] = np.exp(-1./(lam[idx]*tau))/(tau*(1.-np.exp(-1./(lam[idx]*tau))))
-    return ret
+    return th_usyn_xminmax(lam, tau)[0]
 
 
 def th_usyn_xmax(lam, tau):
     """Theoretical steady state xmax for synapse with uniform input"""
-    ret = np.zeros(len(lam))
-    idx = lam > 0
-    ret[idx] = 1./(tau*(1.-np.exp(-1./(lam[idx]*tau))))
-    return ret
+    return th_usyn_xminmax(lam, tau)[1]
 
 
 ###############################################################################
 # numerical methods for determining input, firing rate relations ##############
 ###############################################################################
 def _alif_u_tspk(tspk, tau_m, tref, xt, af, tau_f):
-    """Computes the input u from tspk for an adaptive LIF neuron"""
-    t0 = 1./(1-np.exp(-tspk/tau_m))
-    if tau_m != tau_f:
+    """Computes the input u from tspk for an adaptive LIF neuron
+
+    af and tau_f may be arrays broadcasting with tspk
+    """
+    if (isinstance(tspk, float) and isinstance(af, (int, float)) and
+            isinstance(tau_f, (int, float))):
+        # root finders that work one element at a time call this with
+        # scalars, where numpy's overhead would dominate
+        return _alif_u_tspk_scalar(tspk, tau_m, tref, xt, af, tau_f)
+    t0 = -1./np.expm1(-tspk/tau_m)  # expm1 stays accurate for small tspk
+    same_tau = np.asarray(tau_f) == tau_m
+    with np.errstate(divide='ignore', invalid='ignore'):
         t1 = af*np.exp(-tref/tau_f)*(np.exp(-tspk/tau_f)-np.exp(-tspk/tau_m))
         t2 = (1.-np.exp(-(tref+tspk)/tau_f))*(tau_m-tau_f)
-    elif tau_m == tau_f:  # because Python doesn't know LHopital's Rule
+        ratio = t1/t2
+    if same_tau.any():  # because Python doesn't know LHopital's Rule
         t1 = -af*tspk*np.exp(-(tref+tspk)/tau_m)
         t2 = tau_m**2*(1-np.exp(-(tref+tspk)/tau_m))
-    u = t0*(xt-t1/t2)
+        ratio = np.where(same_tau, t1/t2, ratio)
+    u = t0*(xt-ratio)
     return u
 
 
+def _alif_u_tspk_scalar(tspk, tau_m, tref, xt, af, tau_f):
+    """_alif_u_tspk for scalar tspk, af, and tau_f"""
+    if tspk == 0.:  # no time to reach threshold takes infinite input
+        return float('inf')
+    t0 = -1./math.expm1(-tspk/tau_m)
+    if tau_f == tau_m:
+        g = math.exp(-(tref+tspk)/tau_m)
+        ratio = -af*tspk*g/(tau_m**2*(1-g))
+    else:
+        t1 = af*math.exp(-tref/tau_f)*(
+            math.exp(-tspk/tau_f)-math.exp(-tspk/tau_m))
+        t2 = (1.-math.exp(-(tref+tspk)/tau_f))*(tau_m-tau_f)
+        ratio = t1/t2
+    return t0*(xt-ratio)
+
+
+def _alif_u_tspk_err(tspk, tau_m, tref, xt, af, tau_f, u_in):
+    """Error in u_in from estimating tspk for an adaptive LIF neuron
+
+    Decreases through 0 as tspk increases past the neuron's steady state
+    interspike time
+    """
+    return _alif_u_tspk(tspk, tau_m, tref, xt, af, tau_f) - u_in
+
+
+def _alif_u_tspk_err_prime(tspk, tau_m, tref, xt, af, tau_f, u_in):
+    """Derivative of _alif_u_tspk_err with respect to tspk
+
+    u_in does not affect the derivative but keeps the signature of
+    _alif_u_tspk_err
+    """
+    t0 = -1./np.expm1(-tspk/tau_m)
+    dt0 = -t0*(t0-1.)/tau_m
+    same_tau = np.asarray(tau_f) == tau_m
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ef = np.exp(-tref/tau_f)*np.exp(-tspk/tau_f)
+        em = np.exp(-tref/tau_f)*np.exp(-tspk/tau_m)
+        t2 = (1.-ef)*(tau_m-tau_f)
+        ratio = af*(ef-em)/t2
+        dratio = (af*(em/tau_m-ef/tau_f) - ratio*ef*(tau_m-tau_f)/tau_f)/t2
+    if same_tau.any():
+        g = np.exp(-(tref+tspk)/tau_m)
+        ratio_s = -af*tspk*g/(tau_m**2*(1-g))
+        dratio_s = -af*g/(tau_m**2*(1-g))*(1-tspk/(tau_m*(1-g)))
+        ratio = np.where(same_tau, ratio_s, ratio)
+        dratio = np.where(same_tau, dratio_s, dratio)
+    return dt0*(xt-ratio) - t0*dratio
+
+
+def _bit_midpoint(a, b):
+    """Midpoint between arrays of nonnegative floats a and b in IEEE 754 bits
+
+    The bit patterns of nonnegative floats are ordered like their values, so
+    bisecting the bit patterns halves the number of floats in the bracket.
+    A bracket spanning orders of magnitude narrows to 1 ULP in at most 64
+    steps, where bisecting the values first spends steps on the largest
+    magnitudes.
+    """
+    a_bits = a.view(np.int64)
+    b_bits = b.view(np.int64)
+    # halve before adding so that the sum cannot overflow
+    mid_bits = (a_bits >> 1) + (b_bits >> 1) + (a_bits & b_bits & 1)
+    return mid_bits.view(np.float64)
+
+
+def _vectorized_bisect(func, a, b, args=(), tol=1e-3, max_iter=None,
+                       xtol=0.):
+    """Bisection method applied element-wise to arrays of brackets
+
+    Brackets are bisected in their IEEE 754 bit patterns with _bit_midpoint,
+    so they must be nonnegative. Returns the midpoints of the final brackets
+    and a message describing why the algorithm stopped
+
+    Parameters
+    ----------
+    func : callable
+        vectorized function called as func(x, *args). Each element must be
+        positive below its root and negative above it
+    a : array-like of floats
+        lower ends of the brackets, >= 0
+    b : array-like of floats
+        upper ends of the brackets, >= a
+    args : tuple (optional)
+        extra arguments to func. Array arguments are element-wise with a
+    tol : float (optional)
+        tolerance in func. The algorithm terminates when the maximum absolute
+        value of func at the midpoints is within tol
+    max_iter : int (optional)
+        maximium number of iterations. Defaults to the number of steps needed
+        to split the widest bracket down to adjacent floats
+    xtol : float (optional)
+        tolerance in x. The algorithm also terminates when every bracket is
+        within xtol wide or when no bracket can be split further, which
+        guards against func being too flat near its root to reach tol
+    """
+    a = np.array(a, dtype=float)
+    b = np.array(b, dtype=float)
+    if max_iter is None:
+        # each step halves the number of floats in the bracket
+        nfloats = np.max(b.view(np.int64) - a.view(np.int64))
+        max_iter = int(np.log2(max(nfloats, 1))) + 2
+    exit_msg = 'reached max iterations'
+    for i in range(max_iter):
+        x = _bit_midpoint(a, b)
+        fx = func(x, *args)
+        if np.max(np.abs(fx)) < tol:
+            exit_msg = 'reached tolerance in %d iterations' % (i+1)
+            break
+        above = fx > 0  # the root is above x
+        a = np.where(above, x, a)
+        b = np.where(above, b, x)
+        # adjacent floats differ by 1 in their bit patterns
+        if (xtol > 0. and np.max(b - a) <= xtol or
+                np.max(b.view(np.int64) - a.view(np.int64)) <= 1):
+            x = _bit_midpoint(a, b)
+            exit_msg = 'reached bracket width in %d iterations' % (i+1)
+            break
+    return x, exit_msg
+
+
+def _vectorized_newton(func, fprime, x0, a, b, args=(), tol=1e-3,
+                       max_iter=100):
+    """Newton's method applied element-wise, safeguarded by brackets
+
+    Iterates that leave the bracket known to contain the root are replaced
+    with a bisection step by _bit_midpoint, so brackets must be nonnegative.
+    Each element stops being evaluated once it reaches the tolerance. Returns
+    the final iterates and a message describing why the algorithm stopped
+
+    Parameters
+    ----------
+    func : callable
+        vectorized function called as func(x, *args). Each element must be
+        positive below its root and negative above it
+    fprime : callable
+        derivative of func, called as fprime(x, *args)
+    x0 : array-like of floats
+        initial guesses, within [a, b]
+    a : array-like of floats
+        lower ends of the brackets, >= 0
+    b : array-like of floats
+        upper ends of the brackets, >= a
+    args : tuple (optional)
+        extra arguments to func and fprime. Array arguments are element-wise
+        with x0
+    tol : float (optional)
+        tolerance in func. Each iterate is final once the absolute value of
+        func there is within tol. The algorithm terminates when all are final
+    max_iter : int (optional)
+        maximium number of iterations
+    """
+    x = np.array(x0, dtype=float)
+    a = np.array(a, dtype=float)
+    b = np.array(b, dtype=float)
+    active = np.arange(len(x))  # indices of x yet to reach the tolerance
+    x_a = x
+    exit_msg = 'reached max iterations'
+    for i in range(max_iter):
+        fx = func(x_a, *args)
+        x[active] = x_a
+
+        not_done = np.abs(fx) >= tol
+        if not not_done.any():
+            exit_msg = 'reached tolerance in %d iterations' % (i+1)
+            break
+        if not not_done.all():
+            active = active[not_done]
+            x_a = x_a[not_done]
+            fx = fx[not_done]
+            a = a[not_done]
+            b = b[not_done]
+            args = [arg if np.ndim(arg) == 0 else arg[not_done]
+                    for arg in args]
+
+        # shrink the bracket around the root
+        above = fx > 0  # the root is above x
+        a = np.where(above, x_a, a)
+        b = np.where(above, b, x_a)
+
+        x_a = x_a - fx/fprime(x_a, *args)
+        bisect_idx = ~((x_a > a) & (x_a < b))  # also catches nan
+        x_a[bisect_idx] = _bit_midpoint(a[bisect_idx], b[bisect_idx])
+    return x, exit_msg
+
+
 def num_alif_fi(u_in, tau_m, tref, xt, af, tau_f, min_f=.001, max_f=None,
-                max_iter=100, tol=1e-3, verbose=False):
+                max_iter=None, tol=1e-3, tspk_tol=0., verbose=False):
     """Numerically determine the approximate adaptive LIF neuron tuning curve
 
     Uses the bisection method (binary search in CS parlance) to find the
@@ -216,10 +536,11 @@ def num_alif_fi(u_in, tau_m, tref, xt, af, tau_f, min_f=.001, max_f=None,
         refractory period
     xt : float
         threshold
-    af : float (optional)
-        scales the inhibitory feedback
-    tau_f : float (optional)
-        time constant of the feedback synapse
+    af : array-like of floats or float
+        scales the inhibitory feedback. If an array, one per element of u_in
+    tau_f : array-like of floats or float
+        time constant of the feedback synapse. If an array, one per element
+        of u_in
     min_f : float (optional)
         minimum firing rate to consider nonzero
     max_f : float (optional)
@@ -227,20 +548,28 @@ def num_alif_fi(u_in, tau_m, tref, xt, af, tau_f, min_f=.001, max_f=None,
         maximum firing rate will indeed be within this bound otherwise the
         binary search will break
     max_iter : int (optional)
-        maximium number of iterations in binary search
+        maximium number of iterations in binary search. Defaults to the
+        number of iterations that narrow the search to adjacent floats, past
+        which it cannot improve. Prints a warning if reached before tol
     tol : float (optional)
         tolerance of binary search algorithm in u_in. The algorithm terminates
         when maximum difference between estimated u_in and input u_in is within
         tol
+    tspk_tol : float (optional)
+        tolerance of binary search algorithm in the time from the end of the
+        refractory period to the next spike. The algorithm also terminates
+        when all of the search brackets are within tspk_tol wide
     """
     u_in = scalar_to_array(u_in)
     f_ret = np.zeros_like(u_in)
+    af = np.zeros(u_in.shape) + af
+    tau_f = np.zeros(u_in.shape) + tau_f
     f_high = max_f
     if max_f is None:
         f_high = 1./tref
     f_low = min_f
     tspk_high = 1./f_low - tref
-    tspk_low = 1./f_high - tref
+    tspk_low = max(1./f_high - tref, 0.)  # brackets must be nonnegative
 
     # check for u_in that produces firing rates below the minimum firing rate
     u_min = _alif_u_tspk(tspk_high, tau_m, tref, xt, af, tau_f)
@@ -250,30 +579,32 @@ def num_alif_fi(u_in, tau_m, tref, xt, af, tau_f, min_f=.001, max_f=None,
     tspk_high = np.zeros_like(u_in[idx]) + tspk_high
     tspk_low = np.zeros_like(u_in[idx]) + tspk_low
 
-    exit_msg = 'reached max iterations'
-    for i in xrange(max_iter):
-        assert (tspk_low <= tspk_low).all(), 'binary search failed'
-        tspk = (tspk_high+tspk_low)/2.
-        uhat = _alif_u_tspk(tspk, tau_m, tref, xt, af, tau_f)
-        max_diff = np.max(np.abs(u_in[idx]-uhat))
-        if max_diff < tol:
-            exit_msg = 'reached tolerance in %d iterations' % (i+1)
-            break
-        high_idx = uhat > u_in[idx]  # where our estimate of u_in is too high
-        low_idx = uhat <= u_in[idx]  # where our estimate of u_in is too low
-        tspk_high[low_idx] = tspk[low_idx]
-        tspk_low[high_idx] = tspk[high_idx]
+    args = (tau_m, tref, xt, af[idx], tau_f[idx], u_in[idx])
+    tspk, exit_msg = _vectorized_bisect(
+        _alif_u_tspk_err, tspk_low, tspk_high, args=args,
+        tol=tol, max_iter=max_iter, xtol=tspk_tol)
     f_ret[idx] = 1./(tref+tspk)
     if verbose:
-        print exit_msg
+        print(exit_msg)
+    if exit_msg == 'reached max iterations':
+        nfailed = np.sum(np.abs(_alif_u_tspk_err(tspk, *args)) >= tol)
+        print('Warning (num_alif_fi): ' +
+              '%d of %d firing rates did not reach tol. ' % (
+                  nfailed, len(tspk)) +
+              'Increase max_iter or tspk_tol...')
     return f_ret
 
 
-def scipy_alif_fi(u_in, tau_m, tref, xt, af, tau_f, method=bisect,
-                  min_f=.001, max_f=None, max_iter=100):
+def scipy_alif_fi(u_in, tau_m, tref, xt, af, tau_f, method='bisect',
+                  min_f=.001, max_f=None, max_iter=100, tol=1e-12):
     """Numerically determine the approximate adaptive LIF neuron tuning curve
 
-    Same idea as num_alif_fi but uses scipy methods instead
+    Same idea as num_alif_fi but with a choice of root finding methods.
+    Newton's method and the bisection method are run on all elements of u_in
+    at once. Newton's method starts from the LIF neuron's interspike time,
+    which bounds the adaptive LIF neuron's from below, and falls back to
+    bisection steps when its iterates leave the bracket known to contain the
+    solution. Other methods solve for one element of u_in at a time.
 
     Parameters
     ----------
@@ -289,8 +620,10 @@ def scipy_alif_fi(u_in, tau_m, tref, xt, af, tau_f, method=bisect,
         scales the inhibitory feedback
     tau_f : float (optional)
         time constant of the feedback synapse
-    method : bisect or brentq (optional)
-        scipy method to use
+    method : 'bisect', 'newton', 'brentq', or callable (optional)
+        root finding method. 'brentq' uses scipy.optimize.brentq. A callable
+        is called like scipy's bracketing methods, as
+        method(f, a, b, args=args, maxiter=max_iter)
     min_f : float (optional)
         minimum firing rate to consider nonzero
     max_f : float (optional)
@@ -302,7 +635,7 @@ def scipy_alif_fi(u_in, tau_m, tref, xt, af, tau_f, method=bisect,
     tol : float (optional)
         tolerance of binary search algorithm in u_in. The algorithm terminates
         when maximum difference between estimated u_in and input u_in is within
-        tol
+        tol. Only used by 'newton' and 'bisect'
     """
     f_ret = np.zeros_like(u_in)
     f_high = max_f
@@ -310,7 +643,7 @@ def scipy_alif_fi(u_in, tau_m, tref, xt, af, tau_f, method=bisect,
         f_high = 1./tref
     f_low = min_f
     tspk_high = 1./f_low - tref
-    tspk_low = 1./f_high - tref
+    tspk_low = max(1./f_high - tref, 0.)  # brackets must be nonnegative
 
     # check for u_in that produces firing rates below the minimum firing rate
     u_min = _alif_u_tspk(tspk_high, tau_m, tref, xt, af, tau_f)
@@ -318,12 +651,32 @@ def scipy_alif_fi(u_in, tau_m, tref, xt, af, tau_f, method=bisect,
     if not idx.any():
         return f_ret
 
-    def _root_wrapper(tspk, tau_m, tref, xt, af, tau_f, u_in):
-        return u_in - _alif_u_tspk(tspk, tau_m, tref, xt, af, tau_f)
+    if method == 'newton':
+        tspk0 = 1./th_lif_fi(u_in[idx], tau_m, tref, xt) - tref
+        tspk, _ = _vectorized_newton(
+            _alif_u_tspk_err, _alif_u_tspk_err_prime,
+            np.clip(tspk0, tspk_low, tspk_high),
+            np.zeros_like(u_in[idx]) + tspk_low,
+            np.zeros_like(u_in[idx]) + tspk_high,
+            args=(tau_m, tref, xt, af, tau_f, u_in[idx]),
+            tol=tol, max_iter=max_iter)
+        f_ret[idx] = 1./(tref+tspk)
+        return f_ret
+
+    if method == 'bisect':
+        tspk, _ = _vectorized_bisect(
+            _alif_u_tspk_err, np.zeros_like(u_in[idx]) + tspk_low,
+            np.zeros_like(u_in[idx]) + tspk_high,
+            args=(tau_m, tref, xt, af, tau_f, u_in[idx]),
+            tol=tol, max_iter=max_iter)
+        f_ret[idx] = 1./(tref+tspk)
+        return f_ret
 
+    if method == 'brentq':
+        method = brentq
     f = np.zeros_like(u_in[idx])
     for i, u_val in enumerate(u_in[idx]):
-        tspk0 = method(_root_wrapper, tspk_low, tspk_high,
+        tspk0 = method(_alif_u_tspk_err, tspk_low, tspk_high,
                        args=(tau_m, tref, xt, af, tau_f, u_val),
                        maxiter=max_iter)
         f[i] = 1./(tref+tspk0)
@@ -332,7 +685,7 @@ def scipy_alif_fi(u_in, tau_m, tref, xt, af, tau_f, method=bisect,
 
 
 def num_alif_fi_mu_apx(u_in, tau_m, tref, xt, af, tau_f,
-                       max_iter=100, rel_tol=1e-3,
+                       max_iter=None, rel_tol=1e-3, f_tol=0.,
                        spiking=True, verbose=False):
     """Numerically determine the approximate adaptive LIF neuron tuning curve
 
@@ -340,8 +693,9 @@ def num_alif_fi_mu_apx(u_in, tau_m, tref, xt, af, tau_f,
     steady state feedback value is fixed at its mean (_mu_apx stands for mu
     approximation).
 
-    Uses the bisection method (binary search in CS parlance) to find the
-    steady state firing rate
+    Uses Newton's method to find the steady state firing rate. Iterates that
+    leave the bracket known to contain the solution are replaced with a
+    bisection step.
 
     Parameters
     ----------
@@ -358,11 +712,17 @@ def num_alif_fi_mu_apx(u_in, tau_m, tref, xt, af, tau_f,
     tau_f : float (optional)
         time constant of the feedback synapse
     max_iter : int (optional)
-        maximium number of iterations in binary search
+        maximium number of iterations. Defaults to a few more than the number
+        of bisection steps that narrow the search to within rel_tol of the
+        firing rates, which Newton's method needs far fewer of. Prints a
+        warning if reached before rel_tol
     rel_tol : float (optional)
-        relative tolerance of binary search algorithm. The algorithm terminates
-        when the maximum relative difference between the estimated u_in and the
-        input u_in is within rel_tol
+        relative tolerance of the algorithm. Each firing rate is final once
+        the relative difference between its estimated u_in and the input u_in
+        is within rel_tol. The algorithm terminates when all are final
+    f_tol : float (optional)
+        tolerance of the algorithm in firing rate. Each firing rate is also
+        final once the bracket known to contain it is within f_tol wide
     spiking : bool (optional)
         If True, af is scaled to account for the refractory period.
         If False, af is used as given, which is equivalent to a rate-based
@@ -372,33 +732,65 @@ def num_alif_fi_mu_apx(u_in, tau_m, tref, xt, af, tau_f,
         the tolerance or failed by reaching the maximum number of iterations
     """
     assert af > 0, "inhibitory feedback scaling must be > 0"
-    if spiking:
-        af *= np.exp(-tref/tau_f)
+    # feedback scaling seen by the soma
+    af_eff = af*math.exp(-tref/tau_f) if spiking else af
     u_in = scalar_to_array(u_in)
 
     f_high = th_lif_fi(u_in, tau_m, tref, xt)
     f_ret = np.zeros_like(u_in)
     idx = f_high > 0.
+    u_in = u_in[idx]
     f_high = f_high[idx]
     f_low = np.zeros_like(f_high)
+    f = f_high.copy()  # the solution is below f_high, where Newton converges
+    active = np.arange(len(f))  # indices of f yet to reach the tolerance
+    if max_iter is None:
+        # rel_tol below the float resolution cannot be met, so do not wait
+        # on it for long
+        rel_res = max(rel_tol, np.finfo(float).eps)
+        max_iter = int(np.ceil(np.log2(1./rel_res))) + 4
     exit_msg = 'reached max iterations'
-    for i in xrange(max_iter):
-        f = (f_high+f_low)/2.
-        u_net = th_lif_if(f, tau_m, tref, xt)
-        uf = f*af
-        uhat = u_net + uf
-        high_idx = uhat > u_in[idx]
-        low_idx = uhat <= u_in[idx]
-        f_high[high_idx] = f[high_idx]
-        f_low[low_idx] = f[low_idx]
-
-        max_rel_diff = np.max(np.abs(uhat-u_in[idx])/u_in[idx])
-        if max_rel_diff < rel_tol:
-            exit_msg = 'reached tolerance'
+    for i in range(max_iter):
+        f_a = f[active]
+        u_a = u_in[active]
+        # f stays within (f_low, f_high], so it is > 0
+        u_net = _th_lif_if_arr(f_a, tau_m, tref, xt)
+        uf = f_a*af_eff
+        err = u_net + uf - u_a
+
+        not_done = ((np.abs(err)/u_a >= rel_tol) &
+                    (f_high[active] - f_low[active] > f_tol))
+        if not not_done.any():
+            exit_msg = 'reached tolerance in %d iterations' % (i+1)
             break
+        if not not_done.all():
+            active = active[not_done]
+            f_a = f_a[not_done]
+            u_net = u_net[not_done]
+            err = err[not_done]
+
+        # shrink the bracket around the solution
+        high_idx = err > 0
+        low_idx = ~high_idx
+        f_high[active[high_idx]] = f_a[high_idx]
+        f_low[active[low_idx]] = f_a[low_idx]
+
+        # Newton step using du_net/df = 1/(df/du_net)
+        dudf = u_net*(u_net-xt)/(f_a**2*tau_m*xt) + af_eff
+        f_a = f_a - err/dudf
+        f_low_a = f_low[active]
+        f_high_a = f_high[active]
+        bisect_idx = (f_a <= f_low_a) | (f_a >= f_high_a)
+        f_a[bisect_idx] = (f_high_a[bisect_idx]+f_low_a[bisect_idx])/2.
+        f[active] = f_a
+    else:
+        print('Warning (num_alif_fi_mu_apx): ' +
+              '%d of %d firing rates did not reach rel_tol. ' % (
+                  len(active), len(f)) +
+              'Increase max_iter or f_tol...')
     f_ret[idx] = f
     if verbose:
-        print exit_msg
+        print(exit_msg)
     return f_ret
 
 
@@ -426,6 +818,8 @@ def sim_lif_fi(dt, u, tau, tref, xt):
 
     Parameters
     ----------
+    dt : float
+        time step
     u : array-like of floats
         input
     tau : float
@@ -436,49 +830,101 @@ def sim_lif_fi(dt, u, tau, tref, xt):
         threshold
     """
     # theory used to set how long to simulate
-    th_f = th_lif_fi(u, tau, tref, xt)
+    u = np.asarray(u, dtype=float)
+    th_f = _th_lif_fi_arr(u, tau, tref, xt)
     sim_f = np.zeros_like(th_f)
-    for idx, u_val in enumerate(u):
-        if th_f[idx] < .01:
-            # estimated firing rate too low. would require too long to simulate
-            continue
-        T_f = 1./th_f[idx]  # expected interspike interval
-        # run long enough to collect some spikes
-        run_time = 5.*T_f
-        u_in = u_val+np.zeros(int(np.ceil(run_time/dt)))
-        spike_times = run_lifsoma(dt, u_in, tau, tref, xt)
-        isi = np.diff(spike_times[-3:])
-        if (isi[-2]-isi[-1])/isi[-2] > .01:
-            print('Warning (sim_lif_fi): ' +
-                  'Greater than 1% change in isi between last two isi. ' +
-                  'Something is wrong for u=%.2f...' % u_val)
-        sim_f[idx] = 1./isi[-1]
+    # estimated firing rates too low would require too long to simulate
+    idx = th_f >= .01
+    if not idx.any():
+        return sim_f
+
+    # simulate each input as a separate neuron in one batch, running long
+    # enough to collect some spikes from the slowest neuron
+    run_time = 5./th_f[idx].min()
+    nsteps = int(np.ceil(run_time/dt))
+    u_in = np.broadcast_to(u[idx], (nsteps, np.count_nonzero(idx)))
+    spike_times = run_lifsoma(dt, u_in, tau, tref, xt, flatten1=False)
+
+    # last two interspike intervals of every neuron that spiked enough to
+    # measure them. The rest are left at 0
+    measured = np.array([len(spk_t) >= 3 for spk_t in spike_times])
+    last_spks = np.array([spk_t[-3:] for spk_t, ok in
+                          zip(spike_times, measured) if ok]).reshape(-1, 3)
+    isi = np.diff(last_spks, axis=1)
+    changed = (isi[:, 0]-isi[:, 1])/isi[:, 0] > .01
+    for u_val in u[idx][measured][changed]:
+        print('Warning (sim_lif_fi): ' +
+              'Greater than 1% change in isi between last two isi. ' +
+              'Something is wrong for u=%.2f...' % u_val)
+    sim_f[np.nonzero(idx)[0][measured]] = 1./isi[:, 1]
     return sim_f
 
 
-def _sim_alif_fi_worker(args):
-    return _sim_alif_fi_worker_unwrapped(*args)
+def _alif_fstate0(f, tref, tau_f):
+    """Steady state feedback of an adaptive LIF neuron leaving refraction
+
+    Starting a simulation from this feedback state, with the soma state at 0,
+    places the neuron on its periodic steady state orbit firing at rate f,
+    which shrinks the transient from zero feedback when f is accurate.
+    tau_f may be an array with one time constant per element of f.
+    """
+    f = scalar_to_array(f)
+    return np.exp(-tref/tau_f)/(tau_f*(1.-np.exp(-1./(f*tau_f))))
+
 
+_pool = None
+_pool_nproc = None  # number of worker processes in _pool
 
-def _sim_alif_fi_worker_unwrapped(dt, u_in, tau_m, tref, xt, af, tau_f):
-    num_af = num_alif_fi(u_in, tau_m, tref, xt, af, tau_f)
-    if num_af < .01:
-        # estimated firing rate too low. would require too long to simulate
-        return 0.
-    T_af = 1./num_af  # expected interspike interval
-    # run long enough to reach steady state and collect some spikes
-    run_time = 5.*tau_f+5.*T_af
-    u_in = u_in+np.zeros(int(np.ceil(run_time/dt)))
-    spike_times = run_alifsoma(dt, u_in, tau_m, tref, xt, af, tau_f)
-    isi = np.diff(spike_times[-3:])
-    assert ((isi[-2]-isi[-1])/isi[-2] < .01), (
-        'sim_alif_fi: Greater than 1% change in isi between last two isi. ' +
-        'Has not reached steady state for u_in=%.2f' % u_in)
-    return 1./isi[-1]
+
+def _get_pool(nproc):
+    """Worker pool with nproc processes, kept for reuse between calls
+
+    Forking the workers costs far more than the short simulations of a
+    typical sim_alif_fi call, and the workers keep their compiled numba
+    functions between calls. The pool is replaced if nproc changes. Use
+    _close_pool to shut it down and reset it
+
+    Starting the pool after the parallel numba kernels have run makes the
+    interpreter hang at exit with numba's TBB threading layer. Select
+    another layer, e.g. NUMBA_THREADING_LAYER=workqueue, to mix the two
+    """
+    global _pool, _pool_nproc
+    if _pool is not None and _pool_nproc != nproc:
+        _close_pool()
+    if _pool is None:
+        _pool = Pool(nproc)
+        _pool_nproc = nproc
+    return _pool
+
+
+def _close_pool():
+    """Closes the pool of _get_pool after its workers finish their tasks
+
+    The next _get_pool call starts a new pool. Also runs when the
+    interpreter exits
+    """
+    global _pool, _pool_nproc
+    if _pool is not None:
+        _pool.close()
+        _pool.join()
+        _pool = None
+        _pool_nproc = None
+
+
+# multiprocessing.util registers its own exit handler, which terminates the
+# workers, when it is first imported. Exit handlers run in reverse order of
+# registration, so registering after importing it closes the pool first
+atexit.register(_close_pool)
+
+
+def _sim_alif_fi_batch_worker(tagged_args):
+    """_sim_alif_fi_batch that also returns the index of its args"""
+    idx, args = tagged_args
+    return idx, _sim_alif_fi_batch(*args)
 
 
 def sim_alif_fi(dt, u_in, tau_m, tref, xt, af=1e-3, tau_f=1e-2,
-                max_proc=cpu_count()-1):
+                max_proc=cpu_count()-1, num_af_hint=None):
     """Find the adaptive LIF tuning curve by simulating the neuron
 
     Parameters
@@ -493,34 +939,112 @@ def sim_alif_fi(dt, u_in, tau_m, tref, xt, af=1e-3, tau_f=1e-2,
         refractory period
     xt : float
         threshold
-    af : float (optional)
-        scales the inhibitory feedback
-    tau_f : float (optional)
-        time constant of the feedback synapse
+    af : array-like of floats or float (optional)
+        scales the inhibitory feedback. If an array, one per element of u_in
+    tau_f : array-like of floats or float (optional)
+        time constant of the feedback synapse. If an array, one per element
+        of u_in
     max_proc : int (optional)
-        max number of cores to use
+        max number of cores to use. Elements of u_in that share a dt are
+        simulated together as a batch of neurons in a single process, so
+        this only matters when dt is an array with several distinct values
+    num_af_hint : array-like of floats (optional)
+        num_alif_fi of u_in if the caller has already computed it. Used to set
+        how long to simulate and the starting feedback state. The neurons
+        settle for 5*tau_f before their rates are measured, so an inexact
+        hint does not bias the result. If None, num_alif_fi is computed here
     """
-    if isinstance(dt, (np.ndarray, list)):
-        assert len(dt) == len(u_in), (
-            'lengths of dt and u_in must match when dt is an array')
-        args = [(dt_val, u_val, tau_m, tref, xt, af, tau_f)
-                for u_val, dt_val in zip(u_in, dt)]
-    else:
-        args = [(dt, u_val, tau_m, tref, xt, af, tau_f) for u_val in u_in]
-
-    if (max_proc in (0, None)) or (len(u_in) == 1):
-        sim_af = map(_sim_alif_fi_worker, args)
-    else:
-        workers = Pool(max_proc)
-        sim_af = workers.map(_sim_alif_fi_worker, args)
-        workers.close()
-        workers.join()
-    return np.array(sim_af)
+    u_in = np.asarray(u_in, dtype=float)
+    af = np.zeros(u_in.shape) + af
+    tau_f = np.zeros(u_in.shape) + tau_f
+    if num_af_hint is None:
+        num_af_hint = num_alif_fi(u_in, tau_m, tref, xt, af, tau_f)
+    num_af_hint = np.asarray(num_af_hint, dtype=float)
+    if not isinstance(dt, (np.ndarray, list)):
+        return _sim_alif_fi_batch(dt, u_in, tau_m, tref, xt, af, tau_f,
+                                  num_af_hint)
+
+    assert len(dt) == len(u_in), (
+        'lengths of dt and u_in must match when dt is an array')
+    # simulate the elements sharing each dt together as one batch
+    dt_vals, dt_group = np.unique(dt, return_inverse=True)
+    groups = [np.flatnonzero(dt_group == g) for g in range(len(dt_vals))]
+    args = [(dt_val, u_in[idx], tau_m, tref, xt, af[idx], tau_f[idx],
+             num_af_hint[idx]) for dt_val, idx in zip(dt_vals, groups)]
+    sim_af = np.zeros_like(u_in)
+    if (max_proc in (0, None)) or (len(args) == 1):
+        for g, sim_af_val in map(_sim_alif_fi_batch_worker, enumerate(args)):
+            sim_af[groups[g]] = sim_af_val
+        return sim_af
+
+    # batch costs vary widely with dt and the firing rates, so start the
+    # costliest ones first and collect results as they finish to keep all
+    # the workers busy
+    run_steps = np.where(
+        num_af_hint >= .01,
+        (5.*tau_f+5./np.maximum(num_af_hint, .01))/np.asarray(dt), 0.)
+    cost = [len(idx)*run_steps[idx].max() for idx in groups]
+    order = np.argsort(-np.array(cost), kind='mergesort')
+    for g, sim_af_val in _get_pool(max_proc).imap_unordered(
+            _sim_alif_fi_batch_worker, [(g, args[g]) for g in order],
+            chunksize=max(1, len(args)//(4*max_proc))):
+        sim_af[groups[g]] = sim_af_val
+    return sim_af
+
+
+def _sim_alif_fi_batch(dt, u_in, tau_m, tref, xt, af, tau_f, num_af):
+    """Simulates each element of u_in as a separate neuron in one batch
+
+    af and tau_f hold the feedback parameters of each element of u_in
+    """
+    sim_af = np.zeros_like(u_in)
+    # estimated firing rates too low would require too long to simulate
+    idx = num_af >= .01
+    if not idx.any():
+        return sim_af
+
+    # start near the steady state num_af predicts, but settle for 5*tau_f
+    # regardless so that the simulated rates do not depend on num_af, then
+    # run long enough to collect some spikes from the slowest neuron
+    af = af[idx]
+    tau_f = tau_f[idx]
+    run_time = np.max(5.*tau_f+5./num_af[idx])
+    nsteps = int(np.ceil(run_time/dt))
+    u_batch = np.broadcast_to(u_in[idx], (nsteps, np.count_nonzero(idx)))
+    spike_times = run_alifsoma(dt, u_batch, tau_m, tref, xt, af, tau_f,
+                               flatten1=False,
+                               fstate0=_alif_fstate0(num_af[idx], tref, tau_f))
+    for sim_idx, spk_t, u_val in zip(
+            np.nonzero(idx)[0], spike_times, u_in[idx]):
+        isi = np.diff(spk_t[-3:])
+        assert ((isi[-2]-isi[-1])/isi[-2] < .01), (
+            'sim_alif_fi: Greater than 1% change in isi between last two ' +
+            'isi. Has not reached steady state for u_in=%.2f' % u_val)
+        sim_af[sim_idx] = 1./isi[-1]
+    return sim_af
 
 
 ###############################################################################
 # methods for running neuron models ###########################################
 ###############################################################################
+_LIF_COEFFS_CACHE_SIZE = 128
+_lif_coeffs_cache = {}
+
+
+def _lif_coeffs(dt, tau):
+    """Decay and increment of a first order synapse or soma over one dt
+
+    Cached because plotting routines simulate the same (dt, tau) many times
+    """
+    key = (float(dt), float(tau))  # 0-d arrays are not hashable
+    if key not in _lif_coeffs_cache:
+        if len(_lif_coeffs_cache) >= _LIF_COEFFS_CACHE_SIZE:
+            _lif_coeffs_cache.clear()
+        decay = math.expm1(-dt/tau)+1  # expm1 higher precision version of exp
+        _lif_coeffs_cache[key] = decay, 1-decay
+    return _lif_coeffs_cache[key]
+
+
 def run_lifsoma(dt, u, tau, tref, xt, ret_state=False, flatten1=True):
     """Simulates an LIF soma(s) given an input current
 
@@ -541,62 +1065,98 @@ def run_lifsoma(dt, u, tau, tref, xt, ret_state=False, flatten1=True):
     flatten1 : boolean (optional)
         whether to flatten the outputs if there is only 1 neuron
     """
-    nneurons = 1
-    if len(u.shape) > 1:
-        nneurons = u.shape[1]
-    nsteps = u.shape[0]
-    if nneurons == 1:
-        u.shape = u.shape[0], 1
+    # work on a 2D view of the input without reshaping the caller's. Inputs
+    # broadcast along time, as from np.broadcast_to, are not copied
+    u = np.asarray(u, dtype=float)
+    if u.ndim == 1:
+        u = u.reshape(-1, 1)
+    nsteps, nneurons = u.shape
+
+    decay, increment = _lif_coeffs(dt, tau)
+
+    # only keep the state history if it is to be returned
+    state = np.zeros((nsteps if ret_state else 0, nneurons))
+    nspikes_est = _est_nspikes(dt, u, tau, tref, xt)
+    if numba is None:
+        run_kernel = _run_lifsoma_np
+    elif nneurons > _NB_PARALLEL_MIN_NEURONS:
+        run_kernel = _run_lifsoma_nb_par
+    else:
+        run_kernel = _run_lifsoma_nb
+    spike_idx, spike_t = run_kernel(
+        u, decay, increment, tref, xt, dt, state, nspikes_est)
+    spiketimes = _split_spiketimes(spike_idx, spike_t, nneurons)
+
+    if nneurons == 1 and flatten1:
+        spiketimes = spiketimes[0]
+
+    if ret_state:
+        retval = spiketimes, state
+    else:
+        retval = spiketimes
+    return retval
 
-    decay = np.exp(-dt/tau)
-    increment = (1-decay)
 
-    spiketimes = [[] for i in xrange(nneurons)]
-    state = np.zeros_like(u)
-    refractory_time = np.zeros(nneurons)
+def _run_lifsoma_np(u, decay, increment, tref, xt, dt, state, nspikes_est):
+    """Steps LIF somas through the input with numpy
 
-    for i in xrange(1, nsteps):
-        # update soma state with prev state and input
-        state[i, :] = decay*state[i-1, :] + increment*u[i, :]
-        dV = state[i, :]-state[i-1, :]
+    Returns the neuron index and time of each spike in order of occurrence.
+    The soma state history is written into state unless it has no rows.
+    """
+    nsteps, nneurons = u.shape
+    record_state = len(state) > 0
+    spike_idx = np.empty(nspikes_est, np.int32)
+    spike_t = np.empty(nspikes_est)
+    nspikes = 0
+    # remaining refractory period in units of dt
+    refractory_steps = np.zeros(nneurons)
+    V = np.zeros(nneurons)
+
+    for i in range(1, nsteps):
+        # update soma state with prev state and input. Operating in place
+        # where possible avoids allocating a temporary per operation
+        V_new = increment*u[i, :]
+        V_new += decay*V
+        dV = V_new-V
 
         # update refractory period assuming no spikes for now
-        refractory_time -= dt
+        refractory_steps -= 1.
 
         # set voltages of neurons still in their refractory period to 0
         # and reduce voltage of neurons partway out of their ref. period
-        state[i, :] *= (1-refractory_time/dt).clip(0, 1)
+        V_new *= (1-refractory_steps).clip(0, 1)
 
-        # determine which neurons spike
-        spiked = state[i, :] > xt
-        spiked_idx = np.nonzero(spiked)[0]
+        # determine which neurons spike. Most steps have no spikes, so skip
+        # the spike handling then
+        spiked_idx = np.flatnonzero(V_new > xt)
+        nspiked = len(spiked_idx)
+        if nspiked:
+            # linearly approximate time since neuron crossed spike threshold
+            overshoot = (V_new[spiked_idx] - xt) / dV[spiked_idx]
+            interp_spiketime = dt * (1-overshoot)
 
-        # linearly approximate time since neuron crossed spike threshold
-        overshoot = (state[i, spiked] - xt) / dV[spiked]
-        interp_spiketime = dt * (1-overshoot)
+            # note the specific spike times
+            if nspikes+nspiked > len(spike_t):
+                spike_idx = np.resize(spike_idx, 2*(nspikes+nspiked))
+                spike_t = np.resize(spike_t, 2*(nspikes+nspiked))
+            spike_idx[nspikes:nspikes+nspiked] = spiked_idx
+            spike_t[nspikes:nspikes+nspiked] = interp_spiketime + i*dt
+            nspikes += nspiked
 
-        for idx, spk_t in zip(spiked_idx, interp_spiketime):
-            spiketimes[idx].append(spk_t+i*dt)
+            # set spiking neurons' voltages to zero, and ref. time to tref
+            V_new[spiked_idx] = 0
+            refractory_steps[spiked_idx] = (tref + interp_spiketime) / dt
 
-        # set spiking neurons' voltages to zero, and ref. time to tref
-        state[i, spiked] = 0
-        refractory_time[spiked] = tref + interp_spiketime
+        if record_state:
+            state[i, :] = V_new
+        V = V_new
 
-    if nneurons == 1 and flatten1:
-        spiketimes = np.array(spiketimes[0])
-    else:
-        for idx in xrange(nneurons):
-            spiketimes[idx] = np.array(spiketimes[idx])
-
-    if ret_state:
-        retval = spiketimes, state
-    else:
-        retval = spiketimes
-    return retval
+    return spike_idx[:nspikes], spike_t[:nspikes]
 
 
 def run_alifsoma(dt, u_in, tau_m, tref, xt, af=1e-2, tau_f=1e-2,
-                 ret_state=False, ret_fstate=False, flatten1=True):
+                 ret_state=False, ret_fstate=False, flatten1=True,
+                 state0=0., fstate0=0.):
     """Simulates an adaptive LIF soma(s) given an input current
 
     Returns the spike times of the LIF soma. Can also return the soma and
@@ -612,9 +1172,9 @@ def run_alifsoma(dt, u_in, tau_m, tref, xt, af=1e-2, tau_f=1e-2,
         soma time constant (s)
     xt : float
         threshold
-    af : float (optional)
+    af : array-like (n,) or float (optional)
         scales the feedback synapse state into a current
-    tau_f : float (optional)
+    tau_f : array-like (n,) or float (optional)
         time constant of the feedback synapse
     ret_state : boolean (optional)
         whether to also return the soma state
@@ -622,74 +1182,132 @@ def run_alifsoma(dt, u_in, tau_m, tref, xt, af=1e-2, tau_f=1e-2,
         whether to also return the feedback synapse state
     flatten1 : boolean (optional)
         whether to flatten the outputs if there is only 1 neuron
+    state0 : array-like (n,) or float (optional)
+        initial soma state
+    fstate0 : array-like (n,) or float (optional)
+        initial feedback synapse state
     """
-    nneurons = 1
-    if len(u_in.shape) > 1:
-        nneurons = u_in.shape[1]
-    nsteps = u_in.shape[0]
-    if nneurons == 1:
-        u_in.shape = u_in.shape[0], 1
+    # work on a 2D view of the input without reshaping the caller's. Inputs
+    # broadcast along time, as from np.broadcast_to, are not copied
+    u_in = np.asarray(u_in, dtype=float)
+    if u_in.ndim == 1:
+        u_in = u_in.reshape(-1, 1)
+    nsteps, nneurons = u_in.shape
+
+    decay, increment = _lif_coeffs(dt, tau_m)
+
+    # feedback parameters may differ between neurons, so keep one per column
+    if np.ndim(tau_f) == 0:
+        fdecay, fincrement = _lif_coeffs(dt, tau_f)
+    else:
+        fdecay = np.expm1(-dt/np.asarray(tau_f))+1
+        fincrement = 1-fdecay
+    fdecay = np.zeros(nneurons) + fdecay
+    fincrement = np.zeros(nneurons) + fincrement
+    af = np.zeros(nneurons) + af
+
+    # only keep the state histories that are to be returned
+    V = np.zeros(nneurons) + state0
+    Vf = np.zeros(nneurons) + fstate0
+    state = np.zeros((nsteps if ret_state else 0, nneurons))
+    fstate = np.zeros((nsteps if ret_fstate else 0, nneurons))
+    if ret_state:
+        state[0, :] = V
+    if ret_fstate:
+        fstate[0, :] = Vf
+    # adaptation only lowers the firing rate, so the LIF estimate is a bound
+    nspikes_est = _est_nspikes(dt, u_in, tau_m, tref, xt)
+    if numba is None:
+        run_kernel = _run_alifsoma_np
+    elif nneurons > _NB_PARALLEL_MIN_NEURONS:
+        run_kernel = _run_alifsoma_nb_par
+    else:
+        run_kernel = _run_alifsoma_nb
+    spike_idx, spike_t = run_kernel(
+        u_in, decay, increment, fdecay, fincrement, af, tref, xt, dt,
+        V, Vf, state, fstate, nspikes_est)
+    spiketimes = _split_spiketimes(spike_idx, spike_t, nneurons)
 
-    decay = np.expm1(-dt/tau_m)+1  # expm1 higher precision version of exp
-    increment = (1-decay)
+    if nneurons == 1 and flatten1:
+        spiketimes = spiketimes[0]
+
+    retval = spiketimes
+    if ret_state or ret_fstate:
+        retval = [retval]
+    if ret_state:
+        retval.append(state)
+    if ret_fstate:
+        retval.append(fstate)
+    return retval
 
-    fdecay = np.expm1(-dt/tau_f)+1  # expm1 higher precision version of exp
-    fincrement = (1-fdecay)
 
-    spiketimes = [[] for i in xrange(nneurons)]
-    state = np.zeros_like(u_in)
-    fstate = np.zeros_like(u_in)
-    refractory_time = np.zeros(nneurons)
+def _run_alifsoma_np(u_in, decay, increment, fdecay, fincrement, af, tref, xt,
+                     dt, V, Vf, state, fstate, nspikes_est):
+    """Steps adaptive LIF somas through the input with numpy
 
-    for i in xrange(1, nsteps):
+    Starts from soma and feedback states V and Vf. Vf is updated in place.
+    Returns the neuron index and time of each spike in order of occurrence.
+    The soma and feedback state histories are written into state and fstate
+    unless they have no rows.
+    """
+    nsteps, nneurons = u_in.shape
+    record_state = len(state) > 0
+    record_fstate = len(fstate) > 0
+    spike_idx = np.empty(nspikes_est, np.int32)
+    spike_t = np.empty(nspikes_est)
+    nspikes = 0
+    # remaining refractory period in units of dt
+    refractory_steps = np.zeros(nneurons)
+
+    for i in range(1, nsteps):
         # update feedback with prev state
-        fstate[i, :] = fdecay*fstate[i-1, :]
+        Vf *= fdecay
 
-        # update soma state with prev state, input, and feedback
-        state[i, :] = (decay*state[i-1, :] +
-                       increment*(u_in[i, :] - af*fstate[i, :]))
-        dV = state[i, :]-state[i-1, :]
+        # update soma state with prev state, input, and feedback. Operating
+        # in place where possible avoids allocating a temporary per operation
+        V_new = u_in[i, :] - af*Vf
+        V_new *= increment
+        V_new += decay*V
+        dV = V_new-V
 
         # update refractory period assuming no spikes for now
-        refractory_time -= dt
+        refractory_steps -= 1.
 
         # set voltages of neurons still in their refractory period to 0
         # and reduce voltage of neurons partway out of their ref. period
-        state[i, :] *= (1 - refractory_time / dt).clip(0, 1)
+        V_new *= (1 - refractory_steps).clip(0, 1)
 
-        # determine which neurons spike
-        spiked = state[i, :] > xt
+        # determine which neurons spike. Most steps have no spikes, so skip
+        # the spike handling then
+        spiked_idx = np.flatnonzero(V_new > xt)
+        nspiked = len(spiked_idx)
+        if nspiked:
+            # linearly approximate time since neuron crossed spike threshold
+            overshoot = (V_new[spiked_idx] - xt) / dV[spiked_idx]
+            interp_spiketime = dt * (1 - overshoot)
 
-        # linearly approximate time since neuron crossed spike threshold
-        overshoot = (state[i, spiked] - xt) / dV[spiked]
-        interp_spiketime = dt * (1 - overshoot)
+            # set spiking neurons' voltages to zero, and ref. time to tref
+            V_new[spiked_idx] = 0
+            refractory_steps[spiked_idx] = (tref + interp_spiketime) / dt
 
-        # set spiking neurons' voltages to zero, and ref. time to tref
-        state[i, spiked] = 0
-        refractory_time[spiked] = tref + interp_spiketime
+            # update feedback with current spikes
+            Vf[spiked_idx] += fincrement[spiked_idx]/dt
 
-        # update feedback with current spikes
-        fstate[i, :] += fincrement*spiked/dt
+            # note the specific spike times
+            if nspikes+nspiked > len(spike_t):
+                spike_idx = np.resize(spike_idx, 2*(nspikes+nspiked))
+                spike_t = np.resize(spike_t, 2*(nspikes+nspiked))
+            spike_idx[nspikes:nspikes+nspiked] = spiked_idx
+            spike_t[nspikes:nspikes+nspiked] = interp_spiketime + i*dt
+            nspikes += nspiked
 
-        # note the specific spike times
-        spiked_idx = np.nonzero(spiked)[0]
-        for idx, spk_t in zip(spiked_idx, interp_spiketime):
-            spiketimes[idx].append(spk_t + i * dt)
+        if record_state:
+            state[i, :] = V_new
+        if record_fstate:
+            fstate[i, :] = Vf
+        V = V_new
 
-    if nneurons == 1 and flatten1:
-        spiketimes = np.array(spiketimes[0])
-    else:
-        for idx in xrange(nneurons):
-            spiketimes[idx] = np.array(spiketimes[idx])
-
-    retval = spiketimes
-    if ret_state or ret_fstate:
-        retval = [retval]
-    if ret_state:
-        retval.append(state)
-    if ret_fstate:
-        retval.append(fstate)
-    return retval
+    return spike_idx[:nspikes], spike_t[:nspikes]
 
 
 def run_ralifsoma(dt, u_in, tau_m, tref, xt, af=1e-2, tau_f=1e-2,
@@ -721,32 +1339,246 @@ def run_ralifsoma(dt, u_in, tau_m, tref, xt, af=1e-2, tau_f=1e-2,
         if True, returns the net input current
     flatten1 : boolean
     """
-    nneurons = 1
-    if len(u_in.shape) > 1:
-        nneurons = u_in.shape[1]
-    nsteps = u_in.shape[0]
-    if nneurons == 1:
-        u_in.shape = u_in.shape[0], 1
+    u_in = np.asarray(u_in, dtype=float)
+    if u_in.ndim == 1:
+        u_in = u_in.reshape(-1, 1)  # a view, so the caller's array is intact
+    nsteps, nneurons = u_in.shape
 
     f = np.zeros_like(u_in)
-    u = np.zeros_like(u_in)
     f[0, :] = f0
+    u_net = np.zeros(nneurons)
     if u0 is None:
         idx = f[0, :] > 0
-        u[0, idx] = th_lif_if(f[0, idx], tau_m, tref, xt)
+        u_net[idx] = th_lif_if(f[0, idx], tau_m, tref, xt)
     else:
-        u[0, :] = u0
-    for i in xrange(1, nsteps):
-        dfdt, dudt = th_ralif_dfdt(u[i-1, :], u_in[i-1, :], f[i-1, :],
+        u_net[:] = u0
+    # only keep the net input history if it is to be returned
+    if ret_u:
+        u = np.zeros_like(u_in)
+        u[0, :] = u_net
+    for i in range(1, nsteps):
+        dfdt, dudt = th_ralif_dfdt(u_net, u_in[i-1, :], f[i-1, :],
                                    tau_m, tref, xt, af, tau_f, ret_dudt=True)
-        u[i, :] = u[i-1, :] + dudt * dt
+        u_net = u_net + dudt * dt
         f[i, :] = f[i-1, :] + dfdt * dt
+        if ret_u:
+            u[i, :] = u_net
 
     if nneurons == 1 and flatten1:
         f = f.reshape(-1)
-        u = u.reshape(-1)
+        if ret_u:
+            u = u.reshape(-1)
 
     if ret_u:
         return f, u
     else:
         return f
+
+
+###############################################################################
+# compiled kernels ############################################################
+###############################################################################
+def _est_nspikes(dt, u, tau, tref, xt):
+    """Estimates an upper bound on the number of spikes LIF somas produce
+
+    Used to size spike buffers. Assumes every soma fires at the rate of the
+    largest input for the whole simulation.
+    """
+    nsteps, nneurons = u.shape
+    if u.size == 0:
+        return nneurons
+    # fmax skips NaN inputs. If no estimate can be made, the buffers start
+    # small and grow as spikes arrive
+    max_f = th_lif_fi(float(np.fmax.reduce(u, axis=None)), tau, tref, xt)[0]
+    if not np.isfinite(max_f):
+        max_f = 0.
+    return int(1.5*max_f*nsteps*dt*nneurons) + nneurons
+
+
+def _th_lif_fi_kernel(u, tau, tref, xt):
+    """th_lif_fi for a single u, for compilation into a numba ufunc"""
+    if not (u > xt):  # also catches nan, like the numpy version
+        return 0.
+    return 1./(tref-tau*math.log1p(-xt/u))
+
+
+def _th_lif_if_kernel(f, tau, tref, xt):
+    """th_lif_if for a single f, for compilation into a numba ufunc"""
+    return -xt/math.expm1((tref-1./f)/tau)
+
+
+def _split_spiketimes(spike_idx, spike_t, nneurons):
+    """Splits flat spike records into a list of spike times for each neuron
+
+    Parameters
+    ----------
+    spike_idx : array-like of ints
+        index of the neuron that produced each spike
+    spike_t : array-like of floats
+        time of each spike, in increasing order
+    nneurons : int
+        number of neurons
+    """
+    order = np.argsort(spike_idx, kind='mergesort')  # stable keeps time order
+    splits = np.searchsorted(spike_idx[order], np.arange(1, nneurons))
+    return np.split(spike_t[order], splits)
+
+
+def _trim_spikes(spike_idx, spike_t, nspikes):
+    """Returns the filled part of the spike buffers
+
+    Kept out of the kernels because numba 0.47's parallel array analysis
+    fails on slices of buffers that are reassigned in the parallel loop
+    """
+    return spike_idx[:nspikes], spike_t[:nspikes]
+
+
+def _run_lifsoma_kernel(u, decay, increment, tref, xt, dt, state,
+                        nspikes_est):
+    """Steps LIF somas through the input
+
+    Same model as _run_lifsoma_np written with explicit loops for numba.
+    Returns the neuron index and time of each spike in order of occurrence.
+    The soma state history is written into state unless it has no rows.
+    """
+    nsteps, nneurons = u.shape
+    record_state = state.shape[0] > 0
+    V = np.zeros(nneurons)
+    refractory_steps = np.zeros(nneurons)  # in units of dt
+    spiked = np.zeros(nneurons, np.bool_)
+    interp_spiketime = np.zeros(nneurons)
+    spike_idx = np.empty(nspikes_est, np.int32)
+    spike_t = np.empty(nspikes_est)
+    nspikes = 0
+
+    for i in range(1, nsteps):
+        for j in prange(nneurons):
+            # update soma state with prev state and input
+            V_new = decay*V[j] + increment*u[i, j]
+            dV = V_new-V[j]
+
+            # set voltages of neurons still in their refractory period to 0
+            # and reduce voltage of neurons partway out of their ref. period
+            refractory_steps[j] -= 1.
+            ref_scale = 1-refractory_steps[j]
+            if ref_scale < 0.:
+                ref_scale = 0.
+            elif ref_scale > 1.:
+                ref_scale = 1.
+            V_new *= ref_scale
+
+            # linearly approximate time since neuron crossed spike threshold
+            # then set the voltage to zero and ref. time to tref
+            spiked[j] = V_new > xt
+            if spiked[j]:
+                overshoot = (V_new - xt) / dV
+                interp_spiketime[j] = dt * (1-overshoot)
+                V_new = 0.
+                refractory_steps[j] = (tref + interp_spiketime[j]) / dt
+
+            if record_state:
+                state[i, j] = V_new
+            V[j] = V_new
+
+        # note the specific spike times. The buffers are grown here, once per
+        # step, to fit every neuron spiking, which keeps the reallocation out
+        # of the loop over neurons
+        if nspikes+nneurons > spike_t.shape[0]:
+            spike_idx = np.concatenate(
+                (spike_idx, np.empty(nspikes+nneurons, np.int32)))
+            spike_t = np.concatenate((spike_t, np.empty(nspikes+nneurons)))
+        for j in range(nneurons):
+            if spiked[j]:
+                spike_idx[nspikes] = j
+                spike_t[nspikes] = interp_spiketime[j] + i*dt
+                nspikes += 1
+    return _trim_spikes(spike_idx, spike_t, nspikes)
+
+
+def _run_alifsoma_kernel(u_in, decay, increment, fdecay, fincrement, af, tref,
+                         xt, dt, V, Vf, state, fstate, nspikes_est):
+    """Steps adaptive LIF somas through the input
+
+    Same model as _run_alifsoma_np written with explicit loops for numba.
+    Starts from soma and feedback states V and Vf, which are updated in
+    place. Returns the neuron index and time of each spike in order of
+    occurrence. The soma and feedback state histories are written into state
+    and fstate unless they have no rows.
+    """
+    nsteps, nneurons = u_in.shape
+    record_state = state.shape[0] > 0
+    record_fstate = fstate.shape[0] > 0
+    refractory_steps = np.zeros(nneurons)  # in units of dt
+    spiked = np.zeros(nneurons, np.bool_)
+    interp_spiketime = np.zeros(nneurons)
+    spike_idx = np.empty(nspikes_est, np.int32)
+    spike_t = np.empty(nspikes_est)
+    nspikes = 0
+
+    for i in range(1, nsteps):
+        for j in prange(nneurons):
+            # update soma state with prev state, input, and feedback
+            Vf_new = fdecay[j]*Vf[j]
+            V_new = decay*V[j] + increment*(u_in[i, j] - af[j]*Vf_new)
+            dV = V_new-V[j]
+
+            # set voltages of neurons still in their refractory period to 0
+            # and reduce voltage of neurons partway out of their ref. period
+            refractory_steps[j] -= 1.
+            ref_scale = 1 - refractory_steps[j]
+            if ref_scale < 0.:
+                ref_scale = 0.
+            elif ref_scale > 1.:
+                ref_scale = 1.
+            V_new *= ref_scale
+
+            # linearly approximate time since neuron crossed spike threshold
+            # then set the voltage to zero, ref. time to tref, and update the
+            # feedback with the spike
+            spiked[j] = V_new > xt
+            if spiked[j]:
+                overshoot = (V_new - xt) / dV
+                interp_spiketime[j] = dt * (1 - overshoot)
+                V_new = 0.
+                refractory_steps[j] = (tref + interp_spiketime[j]) / dt
+                Vf_new += fincrement[j]/dt
+
+            if record_state:
+                state[i, j] = V_new
+            if record_fstate:
+                fstate[i, j] = Vf_new
+            V[j] = V_new
+            Vf[j] = Vf_new
+
+        # note the specific spike times. The buffers are grown here, once per
+        # step, to fit every neuron spiking, which keeps the reallocation out
+        # of the loop over neurons
+        if nspikes+nneurons > spike_t.shape[0]:
+            spike_idx = np.concatenate(
+                (spike_idx, np.empty(nspikes+nneurons, np.int32)))
+            spike_t = np.concatenate((spike_t, np.empty(nspikes+nneurons)))
+        for j in range(nneurons):
+            if spiked[j]:
+                spike_idx[nspikes] = j
+                spike_t[nspikes] = interp_spiketime[j] + i * dt
+                nspikes += 1
+    return _trim_spikes(spike_idx, spike_t, nspikes)
+
+
+if numba is not None:
+    _th_lif_fi_nb = numba.vectorize(
+        ['float64(float64, float64, float64, float64)'],
+        nopython=True, cache=True)(_th_lif_fi_kernel)
+    _th_lif_if_nb = numba.vectorize(
+        ['float64(float64, float64, float64, float64)'],
+        nopython=True, cache=True)(_th_lif_if_kernel)
+
+    # the kernels resolve this name when they compile, so it must be compiled
+    _trim_spikes = numba.njit(cache=True)(_trim_spikes)
+
+    # the parallel versions are not cached because numba's cache does not
+    # distinguish them from the serial versions of the same function
+    _run_lifsoma_nb = numba.njit(cache=True)(_run_lifsoma_kernel)
+    _run_lifsoma_nb_par = numba.njit(parallel=True)(_run_lifsoma_kernel)
+    _run_alifsoma_nb = numba.njit(cache=True)(_run_alifsoma_kernel)
+    _run_alifsoma_nb_par = numba.njit(parallel=True)(_run_alifsoma_kernel)
@@ -79,7 +79,7 @@ def filter_spikes(dt, duration, spike_times, tau, x0=0., ret_time=True):
         if bin_idx >= nbins:
             break
         state[bin_idx] += spk_val
-    for idx in xrange(1, nbins):
+    for idx in range(1, nbins):
         state[idx] += decay*state[idx-1]
     if ret_time:
         return time, state